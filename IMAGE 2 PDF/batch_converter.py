@@ -0,0 +1,218 @@
+"""
+Tk-free batch conversion API used by the command-line tool
+"""
+
+import glob
+import os
+import time
+
+from image_converter import ImageConverter
+from epub_converter import EPUBConverter
+from conversion_pool import ConversionPool
+from conversion_metrics import PROFILER, ThroughputCounter
+
+# File extensions picked up when scanning folders
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tif', '.tiff')
+EPUB_EXTENSIONS = ('.epub',)
+
+def file_type_for(path):
+    """Return "image", "epub" or None for a file path"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        return "image"
+    if ext in EPUB_EXTENSIONS:
+        return "epub"
+    return None
+
+def collect_files(patterns):
+    """
+    Expand files, folders and glob patterns into a list of (path, file type).
+    Folders are searched recursively; unsupported files and duplicates are skipped.
+    """
+    files = []
+    seen = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            candidates = []
+            for root, _, names in os.walk(pattern):
+                candidates.extend(os.path.join(root, name) for name in sorted(names))
+        else:
+            candidates = sorted(glob.glob(pattern, recursive=True)) or [pattern]
+        
+        for path in candidates:
+            file_type = file_type_for(path)
+            if file_type and path not in seen and os.path.isfile(path):
+                seen.add(path)
+                files.append((path, file_type))
+    return files
+
+class BatchConverter:
+    """
+    Converts a list of files without the GUI, using the same converters and
+    worker pool as the application.
+    """
+    
+    def __init__(self, options, jobs=None, status_callback=None, cache=None):
+        """
+        Initialize with conversion options, a worker count, an optional status callback
+        and an optional ConversionCache used to skip unchanged inputs
+        """
+        self.options = options
+        self.jobs = jobs
+        self.status_callback = status_callback
+        self.cache = cache
+        self.throughput = ThroughputCounter()
+    
+    def convert(self, files, combine=False):
+        """
+        Convert a list of (path, file type) and return a summary dictionary:
+        converted inputs with their outputs, inputs skipped as unchanged,
+        failed inputs with their errors, the elapsed time and the pages and bytes written.
+        """
+        start_time = time.time()
+        os.makedirs(self.options.output_dir, exist_ok=True)
+        PROFILER.configure(self.options.timings_log)
+        self.throughput.start(len(files))
+        
+        converted = []
+        skipped = []
+        failed = []
+        try:
+            if combine:
+                self._convert_combined(files, converted, skipped, failed)
+            else:
+                self._convert_individual(files, converted, skipped, failed)
+        finally:
+            if self.cache:
+                self.cache.save()
+        PROFILER.event("batch", **self.throughput.snapshot())
+        
+        return {
+            "total": len(files),
+            "converted": converted,
+            "skipped": skipped,
+            "failed": failed,
+            "outputs": sorted(set(item["output"] for item in converted + skipped)),
+            "elapsed_seconds": round(time.time() - start_time, 3),
+            "pages_written": self.throughput.pages,
+            "bytes_written": self.throughput.bytes_out
+        }
+    
+    def _convert_individual(self, files, converted, skipped, failed):
+        """Convert each file to its own PDF on the worker pool"""
+        if len(files) == 1 and files[0][1] == "epub":
+            self._convert_single_epub(files[0][0], converted, skipped, failed)
+            return
+        
+        pool = ConversionPool(self.jobs)
+        try:
+            for file_num, (file_path, file_type) in enumerate(files, start=1):
+                output_path = self.options.output_path(file_path, file_num)
+                # Files with the same output name are converted one after the other
+                while pool.is_writing(output_path):
+                    self._record_result(pool.next_result(), converted, skipped, failed)
+                if self.cache and self.cache.is_current(file_path, output_path, self.options):
+                    pool.add_skipped(file_type, file_path, output_path, self.options)
+                else:
+                    pool.submit(file_type, file_path, file_num, self.options)
+                # Keep a bounded number of files in flight
+                while pool.is_full():
+                    self._record_result(pool.next_result(), converted, skipped, failed)
+            while pool.has_pending():
+                self._record_result(pool.next_result(), converted, skipped, failed)
+        finally:
+            # Wait for the workers to exit, so none is still running when the interpreter shuts down
+            pool.shutdown(wait=True)
+    
+    def _convert_single_epub(self, file_path, converted, skipped, failed):
+        """Convert a lone EPUB with its chapters laid out and drawn on the worker pool"""
+        output_path = self.options.output_path(file_path, 1)
+        if self.cache and self.cache.is_current(file_path, output_path, self.options):
+            skipped.append({"input": file_path, "output": output_path})
+            self.throughput.add()
+            self._report_status(f"Unchanged, skipped: {file_path}")
+            return
+        
+        pool = ConversionPool(self.jobs)
+        converter = EPUBConverter(self.options, self.status_callback)
+        try:
+            converter.convert_to_pdf(file_path, 1, pool=pool)
+        except Exception as e:
+            failed.append({"input": file_path, "error": str(e)})
+            self.throughput.add()
+            self._report_status(f"Failed: {file_path}")
+            return
+        finally:
+            pool.shutdown(wait=True)
+        
+        if self.cache:
+            self.cache.record(file_path, output_path, self.options)
+        converted.append({"input": file_path, "output": output_path})
+        self.throughput.add_output(output_path, pages=converter.page_count)
+        self._report_status(f"Converted: {file_path}")
+    
+    def _convert_combined(self, files, converted, skipped, failed):
+        """Combine the images and the EPUB files into one PDF each"""
+        groups = [
+            (group_type, converter_class, [path for path, file_type in files if file_type == group_type])
+            for group_type, converter_class in (("image", ImageConverter), ("epub", EPUBConverter))
+        ]
+        groups = [group for group in groups if group[2]]
+        
+        for group_type, converter_class, paths in groups:
+            # Give each part its own file when both images and EPUB files are combined
+            options = self.options
+            if len(groups) > 1:
+                options = options.for_combined_part("images" if group_type == "image" else "epub")
+            
+            output_path = options.combined_output_path()
+            if self.cache and self.cache.is_combined_current(paths, output_path, options):
+                skipped.extend({"input": path, "output": output_path} for path in paths)
+                self.throughput.add(len(paths))
+                continue
+            
+            converter = converter_class(options, self.status_callback)
+            pool = ConversionPool(self.jobs)
+            try:
+                output_path = converter.convert_multiple_to_pdf(paths, pool=pool)
+            except Exception as e:
+                failed.extend({"input": path, "error": str(e)} for path in paths)
+                self.throughput.add(len(paths))
+                continue
+            finally:
+                pool.shutdown(wait=True)
+            
+            errors = dict(converter.errors)
+            self.throughput.add_output(output_path, files=len(paths), pages=converter.page_count)
+            for path in paths:
+                if path in errors:
+                    failed.append({"input": path, "error": errors[path]})
+                else:
+                    converted.append({"input": path, "output": output_path})
+            
+            # Only a complete document counts as up to date next time
+            if self.cache and not errors:
+                self.cache.record_combined(paths, output_path, options)
+    
+    def _record_result(self, result, converted, skipped, failed):
+        """Add a worker pool result to the summary lists and count it as done"""
+        file_path = result.file_path
+        if result.error is not None:
+            failed.append({"input": file_path, "error": str(result.error)})
+            self.throughput.add()
+            self._report_status(f"Failed: {file_path}")
+        elif result.skipped:
+            skipped.append({"input": file_path, "output": result.output_path})
+            self.throughput.add()
+            self._report_status(f"Unchanged, skipped: {file_path}")
+        else:
+            if self.cache:
+                self.cache.record(file_path, result.output_path, result.options)
+            converted.append({"input": file_path, "output": result.output_path})
+            self.throughput.add_output(result.output_path, pages=result.pages)
+            self._report_status(f"Converted: {file_path}")
+    
+    def _report_status(self, message):
+        """Pass a status message to the callback, if any"""
+        if self.status_callback:
+            self.status_callback(message)
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for ImageConverter and EPUBConverter.
+Generates reproducible synthetic inputs, runs the individual and combined
+paths of both converters and reports throughput, per-stage timings and
+peak memory as JSON.
+    
+    python benchmark_converters.py --preset small --output results.json
+    python benchmark_converters.py --baseline results.json --max-regression 0.10
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+from PIL import Image, ImageDraw
+
+from conversion_options import ConversionOptions
+from image_converter import ImageConverter
+from epub_converter import EPUBConverter
+from conversion_pool import ConversionPool, default_worker_count
+from conversion_metrics import PROFILER, timings_log_path
+
+# Input sets: image resolutions, copies per format and resolution, EPUB books/chapters/paragraphs
+PRESETS = {
+    "small": {
+        "image_sizes": [(640, 480), (2000, 1500)],
+        "images_per_size": 2,
+        "epub_books": 2,
+        "epub_chapters": 5,
+        "epub_paragraphs": 20
+    },
+    "full": {
+        "image_sizes": [(1024, 768), (4000, 3000), (7728, 5152)],
+        "images_per_size": 4,
+        "epub_books": 4,
+        "epub_chapters": 40,
+        "epub_paragraphs": 60
+    }
+}
+
+IMAGE_FORMATS = (("jpg", "JPEG"), ("png", "PNG"), ("tiff", "TIFF"))
+
+# Fixed word list so generated text is identical between runs
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+         "incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud "
+         "exercitation ullamco laboris nisi aliquip ex ea commodo consequat").split()
+
+def generate_images(folder, preset):
+    """Write deterministic JPEG, PNG and TIFF images and return their paths"""
+    paths = []
+    for width, height in preset["image_sizes"]:
+        for copy_num in range(preset["images_per_size"]):
+            # Shift the fractal a little per copy so no two images are identical
+            shift = copy_num * 0.05
+            img = Image.effect_mandelbrot((width, height), (-2.0 + shift, -1.2, 1.0 + shift, 1.2), 64)
+            img = Image.merge("RGB", (img, img.rotate(180), Image.linear_gradient("L").resize((width, height))))
+            draw = ImageDraw.Draw(img)
+            draw.rectangle((width // 10, height // 10, width // 3, height // 3), outline=(255, 255, 255), width=5)
+            
+            for ext, pil_format in IMAGE_FORMATS:
+                path = os.path.join(folder, f"image_{width}x{height}_{copy_num}.{ext}")
+                save_args = {"quality": 90} if pil_format == "JPEG" else {}
+                img.save(path, pil_format, **save_args)
+                paths.append(path)
+    return paths
+
+def generate_epubs(folder, preset):
+    """Write deterministic EPUB files with many chapters and long paragraphs and return their paths"""
+    from ebooklib import epub
+    
+    paths = []
+    for book_num in range(preset["epub_books"]):
+        book = epub.EpubBook()
+        book.set_identifier(f"benchmark-book-{book_num}")
+        book.set_title(f"Benchmark Book {book_num}")
+        book.set_language("en")
+        
+        chapters = []
+        for chapter_num in range(preset["epub_chapters"]):
+            paragraphs = []
+            for paragraph_num in range(preset["epub_paragraphs"]):
+                length = 40 + (book_num * 7 + chapter_num * 13 + paragraph_num * 17) % 160
+                words = [WORDS[(paragraph_num + i * 3) % len(WORDS)] for i in range(length)]
+                paragraphs.append(f"<p>{' '.join(words)}</p>")
+            chapter = epub.EpubHtml(title=f"Chapter {chapter_num}", file_name=f"chapter_{chapter_num}.xhtml")
+            chapter.content = f"<html><body><h1>Chapter {chapter_num}</h1>{''.join(paragraphs)}</body></html>"
+            book.add_item(chapter)
+            chapters.append(chapter)
+        
+        book.toc = chapters
+        book.spine = ["nav"] + chapters
+        book.add_item(epub.EpubNcx())
+        book.add_item(epub.EpubNav())
+        
+        path = os.path.join(folder, f"book_{book_num}.epub")
+        epub.write_epub(path, book)
+        paths.append(path)
+    return paths
+
+def count_pdf_pages(path):
+    """Read the page count from the root page tree of a generated PDF"""
+    with open(path, "rb") as f:
+        data = f.read()
+    counts = [int(value) for value in re.findall(rb"/Type\s*/Pages\s*/Count\s+(\d+)", data)]
+    counts += [int(value) for value in re.findall(rb"/Count\s+(\d+)\s*/Kids", data)]
+    return max(counts) if counts else 0
+
+def peak_rss_mb(who="self"):
+    """
+    Peak resident memory in MB of the current process ("self") or of its
+    largest finished child process ("children"), or None if unknown
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if who == "children" else resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+def stage_totals(log_path):
+    """
+    Count and total seconds of each stage in a timing log, over all processes.
+    Stages nest (a "file" stage contains its "prepare", "encode" and "write"
+    stages), so the totals of different stages overlap.
+    """
+    totals = {}
+    try:
+        with open(log_path, "r", encoding="utf-8") as f:
+            events = [json.loads(line) for line in f if line.strip()]
+    except OSError:
+        return totals
+    
+    for event in events:
+        if event.get("event") != "stage":
+            continue
+        total = totals.setdefault(event["stage"], {"count": 0, "seconds": 0})
+        total["count"] += 1
+        total["seconds"] += event["seconds"]
+    for total in totals.values():
+        total["seconds"] = round(total["seconds"], 3)
+    return dict(sorted(totals.items()))
+
+def run_case(case, inputs, output_dir, options_kwargs, jobs=1):
+    """Run one benchmark case and return its measurements"""
+    converter_class = ImageConverter if case.startswith("image") else EPUBConverter
+    # Every process, workers included, logs its stage timings here
+    log_path = timings_log_path(output_dir)
+    options = ConversionOptions(output_dir, timings_log=log_path, **options_kwargs)
+    converter = converter_class(options)
+    
+    # Worker processes are only started on first use
+    pool = ConversionPool(jobs) if case.endswith("_parallel") else None
+    try:
+        start_time = time.perf_counter()
+        if case.endswith("individual"):
+            outputs = [converter.convert_to_pdf(path, num) for num, path in enumerate(inputs, start=1)]
+        elif case.endswith("combined_parallel"):
+            outputs = [converter.convert_multiple_to_pdf(inputs, pool=pool)]
+        elif case == "epub_individual_parallel":
+            outputs = [converter.convert_to_pdf(path, num, pool=pool) for num, path in enumerate(inputs, start=1)]
+        else:
+            outputs = [converter.convert_multiple_to_pdf(inputs)]
+        wall_seconds = time.perf_counter() - start_time
+    finally:
+        if pool is not None:
+            # Wait for the workers to exit, so their memory counts in RUSAGE_CHILDREN
+            pool.shutdown(wait=True)
+    PROFILER.configure(None)
+    
+    input_mb = sum(os.path.getsize(path) for path in inputs) / (1024 * 1024)
+    output_mb = sum(os.path.getsize(path) for path in outputs) / (1024 * 1024)
+    pages = sum(count_pdf_pages(path) for path in outputs)
+    return {
+        "files": len(inputs),
+        "jobs": jobs if case.endswith("_parallel") else 1,
+        "pages": pages,
+        "wall_seconds": round(wall_seconds, 3),
+        "pages_per_sec": round(pages / wall_seconds, 2) if wall_seconds else None,
+        "input_mb": round(input_mb, 2),
+        "output_mb": round(output_mb, 2),
+        "mb_per_sec": round(input_mb / wall_seconds, 2) if wall_seconds else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_worker_rss_mb": peak_rss_mb("children") if case.endswith("_parallel") else None,
+        "stages": stage_totals(log_path)
+    }
+
+def run_isolated(case, inputs, output_dir, options_kwargs, jobs):
+    """Run a case in a freshly spawned process, so peak RSS belongs to that case alone"""
+    # A plain process rather than multiprocessing.Pool, whose daemonic workers cannot start a ConversionPool
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=send_case_result,
+                              args=(sender, case, inputs, output_dir, options_kwargs, jobs))
+    process.start()
+    sender.close()
+    try:
+        result, error = receiver.recv()
+    except EOFError:
+        raise RuntimeError(f"Benchmark case {case} exited without a result")
+    finally:
+        receiver.close()
+        process.join()
+    if error is not None:
+        raise error
+    return result
+
+def send_case_result(connection, *args):
+    """Run a case and send (result, None) or (None, error) back (runs in the spawned process)"""
+    try:
+        outcome = (run_case(*args), None)
+    except Exception as e:
+        outcome = (None, e)
+    connection.send(outcome)
+    connection.close()
+
+def run_benchmarks(preset_name, repeat, workdir, options_kwargs, jobs=1):
+    """Generate inputs, run every case and return the report dictionary"""
+    preset = PRESETS[preset_name]
+    input_dir = os.path.join(workdir, "inputs")
+    os.makedirs(input_dir, exist_ok=True)
+    
+    stages = {}
+    start_time = time.perf_counter()
+    image_paths = generate_images(input_dir, preset)
+    stages["generate_images"] = round(time.perf_counter() - start_time, 3)
+    
+    start_time = time.perf_counter()
+    epub_paths = generate_epubs(input_dir, preset)
+    stages["generate_epubs"] = round(time.perf_counter() - start_time, 3)
+    
+    cases = {
+        "image_individual": image_paths,
+        "image_combined": image_paths,
+        "image_combined_parallel": image_paths,
+        "epub_individual": epub_paths,
+        "epub_individual_parallel": epub_paths,
+        "epub_combined": epub_paths,
+        "epub_combined_parallel": epub_paths
+    }
+    
+    report_cases = {}
+    for case, inputs in cases.items():
+        runs = []
+        for run_num in range(repeat):
+            output_dir = os.path.join(workdir, f"{case}_{run_num}")
+            os.makedirs(output_dir, exist_ok=True)
+            runs.append(run_isolated(case, inputs, output_dir, options_kwargs, jobs))
+            shutil.rmtree(output_dir, ignore_errors=True)
+        # Report the fastest run; it is the least disturbed by other load on the machine
+        best = min(runs, key=lambda run: run["wall_seconds"])
+        best["runs_wall_seconds"] = [run["wall_seconds"] for run in runs]
+        report_cases[case] = best
+        stages[case] = best["stages"]
+    
+    return {
+        "environment": environment_info(),
+        "config": {"preset": preset_name, "repeat": repeat, "jobs": jobs, "options": options_kwargs, **preset},
+        "stages": stages,
+        "cases": report_cases
+    }
+
+def environment_info():
+    """Versions and hardware the numbers were measured on"""
+    import PIL
+    import reportlab
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pillow": PIL.__version__,
+        "reportlab": reportlab.Version
+    }
+
+def find_regressions(report, baseline, max_regression):
+    """List cases whose pages/sec dropped by more than max_regression (a fraction) against the baseline"""
+    regressions = []
+    for case, result in report["cases"].items():
+        old = baseline.get("cases", {}).get(case)
+        if not old or not old.get("pages_per_sec") or not result.get("pages_per_sec"):
+            continue
+        change = result["pages_per_sec"] / old["pages_per_sec"] - 1
+        if change < -max_regression:
+            regressions.append(f"{case}: {old['pages_per_sec']} -> {result['pages_per_sec']} pages/sec ({change:+.0%})")
+    return regressions
+
+def main(argv=None):
+    """Run the benchmarks and return the process exit code"""
+    parser = argparse.ArgumentParser(description="Benchmark the image and EPUB converters.")
+    parser.add_argument("--preset", choices=list(PRESETS), default="small", help="input set to generate (default: small)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case; the fastest is reported (default: 3)")
+    parser.add_argument("--page-size", default="letter", help="page size passed to the converters")
+    parser.add_argument("--quality", type=int, default=85, help="image quality passed to the converters")
+    parser.add_argument("-j", "--jobs", type=int, default=default_worker_count(),
+                        help="worker processes for the parallel cases (default: one per CPU core)")
+    parser.add_argument("--workdir", help="keep generated inputs and outputs here instead of a temporary folder")
+    parser.add_argument("--output", help="write the JSON report to this file as well as stdout")
+    parser.add_argument("--baseline", help="earlier JSON report to compare pages/sec against")
+    parser.add_argument("--max-regression", type=float, default=0.10,
+                        help="allowed pages/sec drop against the baseline, as a fraction (default: 0.10)")
+    args = parser.parse_args(argv)
+    
+    options_kwargs = {"page_size": args.page_size, "quality": args.quality}
+    workdir = args.workdir or tempfile.mkdtemp(prefix="pdf_converter_benchmark_")
+    try:
+        report = run_benchmarks(args.preset, max(1, args.repeat), workdir, options_kwargs, max(1, args.jobs))
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = find_regressions(report, json.load(f), args.max_regression)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+Manifest of earlier conversions, used to skip inputs that have not changed
+"""
+
+import hashlib
+import json
+import os
+import time
+
+# Name of the manifest file kept in the output directory
+MANIFEST_NAME = ".pdf_converter_manifest.json"
+
+# Bump when converter changes make earlier outputs stale
+CACHE_VERSION = 1
+
+def file_hash(path):
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class ConversionCache:
+    """
+    Maps each converted input (path, size, mtime and optionally a content hash)
+    plus the conversion settings to the PDF it produced.
+    The manifest is loaded once, so every lookup is a dictionary access and a few stat calls.
+    """
+    
+    def __init__(self, output_dir, verify_content=False, save_interval=30):
+        """Initialize for an output directory; the manifest is read on first use"""
+        self.manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        self.verify_content = verify_content
+        self.save_interval = save_interval
+        self._entries = None
+        self._dirty = False
+        self._last_save = time.time()
+    
+    def is_current(self, input_path, output_path, options):
+        """Check whether input_path was already converted to output_path with the same settings"""
+        return self._check(os.path.abspath(input_path), [input_path], output_path, options)
+    
+    def is_combined_current(self, input_paths, output_path, options):
+        """Check whether a combined PDF was already built from the same inputs with the same settings"""
+        return self._check(self._combined_key(output_path), input_paths, output_path, options)
+    
+    def record(self, input_path, output_path, options):
+        """Remember a finished conversion"""
+        self._store(os.path.abspath(input_path), [input_path], output_path, options)
+    
+    def record_combined(self, input_paths, output_path, options):
+        """Remember a finished combined conversion"""
+        self._store(self._combined_key(output_path), input_paths, output_path, options)
+    
+    def save(self):
+        """Write the manifest if anything changed (atomically, via a temporary file)"""
+        if not self._dirty:
+            return
+        temp_path = self.manifest_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION, "entries": self._entries}, f, separators=(",", ":"))
+        os.replace(temp_path, self.manifest_path)
+        self._dirty = False
+        self._last_save = time.time()
+    
+    def _check(self, key, input_paths, output_path, options):
+        """Compare a manifest entry with the current inputs, settings and output"""
+        entry = self._get_entries().get(key)
+        if entry is None or entry["settings"] != options.settings_fingerprint():
+            return False
+        if os.path.abspath(output_path) != entry["output"] or not os.path.exists(output_path):
+            return False
+        if len(entry["inputs"]) != len(input_paths):
+            return False
+        
+        updated = []
+        for path, stored in zip(input_paths, entry["inputs"]):
+            if os.path.abspath(path) != stored["path"]:
+                return False
+            identity = self._identity(path, stored)
+            if identity is None:
+                return False
+            updated.append(identity)
+        
+        # Content matched for inputs that were only touched; remember their new mtime
+        if updated != entry["inputs"]:
+            entry["inputs"] = updated
+            self._mark_dirty()
+        return True
+    
+    def _store(self, key, input_paths, output_path, options):
+        """Add or replace a manifest entry"""
+        inputs = []
+        for path in input_paths:
+            stat = os.stat(path)
+            identity = {"path": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime_ns}
+            if self.verify_content:
+                identity["sha256"] = file_hash(path)
+            inputs.append(identity)
+        self._get_entries()[key] = {
+            "inputs": inputs,
+            "settings": options.settings_fingerprint(),
+            "output": os.path.abspath(output_path)
+        }
+        self._mark_dirty()
+    
+    def _identity(self, path, stored):
+        """
+        Return the current identity of an input if it still matches the stored one, else None.
+        Size and mtime decide; with verify_content a changed mtime falls back to the content hash.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if stat.st_size != stored["size"]:
+            return None
+        if stat.st_mtime_ns == stored["mtime"]:
+            return stored
+        if not self.verify_content or "sha256" not in stored:
+            return None
+        if file_hash(path) != stored["sha256"]:
+            return None
+        return dict(stored, mtime=stat.st_mtime_ns)
+    
+    def _combined_key(self, output_path):
+        """Manifest key for a combined PDF"""
+        return "combined:" + os.path.abspath(output_path)
+    
+    def _get_entries(self):
+        """Load the manifest on first use; a missing, unreadable or outdated one starts empty"""
+        if self._entries is None:
+            self._entries = {}
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+                if manifest.get("version") == CACHE_VERSION:
+                    self._entries = manifest["entries"]
+            except (OSError, ValueError, KeyError, AttributeError):
+                pass
+        return self._entries
+    
+    def _mark_dirty(self):
+        """Note a change and save now and then so a crash loses little work"""
+        self._dirty = True
+        if time.time() - self._last_save >= self.save_interval:
+            self.save()
@@ -0,0 +1,192 @@
+"""
+Per-stage timing events and running throughput counters for conversions
+"""
+
+import json
+import os
+import time
+
+# Name of the timing log written to the output directory when stage timings are switched on
+TIMINGS_LOG_NAME = "pdf_converter_timings.jsonl"
+
+class StageProfiler:
+    """
+    Appends one JSON line per event to a log file: stage timings (decoding,
+    parsing, layout, drawing, saving, ...) and counter snapshots.
+    Each process has its own profiler; worker processes switch theirs on and off
+    from the log path in the conversion options they are given. While it is off,
+    stage() hands out a shared timer that does nothing, so instrumented code only
+    pays for a method call.
+    """
+    
+    def __init__(self):
+        """Initialize switched off"""
+        self.log_path = None
+        self._fd = None
+    
+    @property
+    def enabled(self):
+        """Whether events are being written"""
+        return self._fd is not None
+    
+    def configure(self, log_path):
+        """Write events to log_path from now on, or stop writing them if it is None"""
+        if log_path == self.log_path:
+            return
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self.log_path = log_path
+        if log_path:
+            # Append mode, so lines written by several processes end up whole and in order
+            self._fd = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    
+    def stage(self, name, **fields):
+        """Context manager timing a stage; extra fields are written with the event"""
+        if self._fd is None:
+            return NO_STAGE
+        return StageTimer(self, name, fields)
+    
+    def event(self, name, **fields):
+        """Write an event with the given fields, if profiling is on"""
+        if self._fd is None:
+            return
+        record = {"time": round(time.time(), 6), "pid": os.getpid(), "event": name}
+        record.update(fields)
+        # One write per line; a line is never split between writes
+        os.write(self._fd, (json.dumps(record, default=str) + "\n").encode("utf-8"))
+
+class StageTimer:
+    """Times the block it is used in and writes a "stage" event when it ends"""
+    
+    def __init__(self, profiler, name, fields):
+        """Initialize for one stage"""
+        self.profiler = profiler
+        self.name = name
+        self.fields = fields
+        self.start = None
+    
+    def __enter__(self):
+        """Start the clock"""
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Write the stage's duration, and whether it failed"""
+        seconds = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.fields["error"] = str(exc_value)
+        self.profiler.event("stage", stage=self.name, seconds=round(seconds, 6), **self.fields)
+        return False
+    
+    def add(self, **fields):
+        """Add fields known only once the stage has run (page counts, sizes)"""
+        self.fields.update(fields)
+
+class NoStage:
+    """Stage timer used while profiling is off"""
+    
+    def __enter__(self):
+        """Do nothing"""
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Do nothing"""
+        return False
+    
+    def add(self, **fields):
+        """Ignore the fields"""
+
+NO_STAGE = NoStage()
+
+# Profiler of this process
+PROFILER = StageProfiler()
+
+def timings_log_path(output_dir):
+    """Path of the timing log kept in an output directory"""
+    return os.path.join(output_dir, TIMINGS_LOG_NAME)
+
+def format_duration(seconds):
+    """Format a duration as H:MM:SS, or M:SS under an hour"""
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+class ThroughputCounter:
+    """
+    Running totals of a batch (files done, pages and bytes written) with the
+    rates since the batch started and an estimate of the time left
+    """
+    
+    def __init__(self):
+        """Initialize an empty counter"""
+        self.start(0)
+    
+    def start(self, total_files):
+        """Start counting a batch of total_files files"""
+        self.total_files = total_files
+        self.files = 0
+        self.pages = 0
+        self.bytes_out = 0
+        self.started = time.perf_counter()
+    
+    def add_total(self, files):
+        """Count more files into the batch, for files found after it started"""
+        self.total_files += files
+    
+    def add(self, files=1, pages=0, bytes_out=0):
+        """Count finished files (converted, skipped or failed) and what was written for them"""
+        self.files += files
+        self.pages += pages
+        self.bytes_out += bytes_out
+    
+    def add_output(self, output_path, files=1, pages=0):
+        """Count finished files written to output_path"""
+        try:
+            bytes_out = os.path.getsize(output_path)
+        except OSError:
+            bytes_out = 0
+        self.add(files, pages, bytes_out)
+    
+    def elapsed(self):
+        """Seconds since the batch started"""
+        return time.perf_counter() - self.started
+    
+    def fraction_done(self):
+        """Share of the batch's files that are done, from 0 to 1"""
+        if not self.total_files:
+            return 0
+        return min(1, self.files / self.total_files)
+    
+    def eta(self):
+        """Estimated seconds until the batch is done, or None before the first file"""
+        if not self.files or self.files >= self.total_files:
+            return None
+        return self.elapsed() / self.files * (self.total_files - self.files)
+    
+    def snapshot(self):
+        """Counters and rates as a dictionary, for the timing log"""
+        elapsed = self.elapsed()
+        eta = self.eta()
+        return {
+            "files": self.files,
+            "total_files": self.total_files,
+            "pages": self.pages,
+            "bytes_out": self.bytes_out,
+            "elapsed_seconds": round(elapsed, 3),
+            "files_per_sec": round(self.files / elapsed, 3) if elapsed else None,
+            "pages_per_sec": round(self.pages / elapsed, 3) if elapsed else None,
+            "eta_seconds": round(eta, 1) if eta is not None else None
+        }
+    
+    def summary(self):
+        """Short progress line for the status bar"""
+        elapsed = self.elapsed() or 1e-9
+        text = (f"{self.files}/{self.total_files} files, {self.files / elapsed:.1f} files/s, "
+                f"{self.pages / elapsed:.1f} pages/s, {self.bytes_out / (1024 * 1024):.1f} MB written")
+        eta = self.eta()
+        if eta is not None:
+            text += f", ETA {format_duration(eta)}"
+        return text
@@ -0,0 +1,113 @@
+"""
+Conversion settings shared by the GUI and the worker processes
+"""
+
+import copy
+import os
+from reportlab.lib.pagesizes import letter, A4, legal
+from reportlab.lib.units import inch
+
+from conversion_metrics import timings_log_path
+from html_extractor import DEFAULT_PARSER
+
+# Page sizes offered in the options frame
+PAGE_SIZES = {
+    "letter": letter,
+    "A4": A4,
+    "legal": legal,
+    "tabloid": (11*inch, 17*inch)  # Define tabloid size manually
+}
+
+# Images are downsampled to at most this resolution on the page
+DEFAULT_MAX_DPI = 300
+
+# Output profiles: "standard" PDF 1.4 files, or "compact" ones with compressed
+# content streams, object streams and binary (not ASCII85-encoded) images
+PDF_PROFILES = ("standard", "compact")
+
+class ConversionOptions:
+    """
+    Plain snapshot of the settings used by the converters.
+    Unlike the Tk variables on the app it can be pickled and sent to worker processes.
+    """
+    
+    def __init__(self, output_dir, page_size="letter", quality=100,
+                 combined_filename="combined_document", filename_pattern="",
+                 max_dpi=DEFAULT_MAX_DPI, linearize=False, pdf_profile="standard",
+                 timings_log=None):
+        """Initialize the options"""
+        self.output_dir = output_dir
+        self.page_size = page_size
+        self.quality = quality
+        self.max_dpi = max_dpi
+        self.combined_filename = combined_filename
+        self.filename_pattern = filename_pattern
+        # Write combined PDFs linearized ("fast web view")
+        self.linearize = linearize
+        self.pdf_profile = pdf_profile
+        # JSON lines file for per-stage timing events, or None to leave profiling off
+        self.timings_log = timings_log
+    
+    @classmethod
+    def from_app(cls, app):
+        """Read the current settings from the application (Tk thread only)"""
+        return cls(
+            output_dir=app.output_dir,
+            page_size=app.page_size.get(),
+            quality=app.quality.get(),
+            combined_filename=app.combined_filename.get(),
+            filename_pattern=app.override_filename.get() if app.custom_filename.get() else "",
+            linearize=app.linearize.get(),
+            pdf_profile=app.pdf_profile.get(),
+            timings_log=timings_log_path(app.output_dir) if app.log_timings.get() else None
+        )
+    
+    def settings_fingerprint(self):
+        """String identifying the settings that change what a converted page looks like or how the file is laid out"""
+        fingerprint = f"{self.page_size}|{self.quality}|{self.max_dpi}"
+        if self.pdf_profile != "standard":
+            fingerprint += f"|{self.pdf_profile}"
+        if DEFAULT_PARSER != "html.parser":
+            # EPUB text parsed by lxml can be split into blocks differently
+            fingerprint += f"|{DEFAULT_PARSER}"
+        return fingerprint + "|linearized" if self.linearize else fingerprint
+    
+    @property
+    def compact(self):
+        """Whether the compact output profile is selected"""
+        return self.pdf_profile == "compact"
+    
+    def writer_options(self, combined=False):
+        """Keyword arguments for StreamingPDFWriter under the selected output profile"""
+        # The linearizer reads cross-reference tables, so files it rewrites are written without object streams
+        return {"compress": self.compact, "object_streams": self.compact and not (combined and self.linearize)}
+    
+    def get_page_size(self):
+        """Get the selected page size in points"""
+        return PAGE_SIZES.get(self.page_size, letter)
+    
+    def output_path(self, source_path, file_num=1):
+        """Build the output path for an individually converted file"""
+        base_name = os.path.splitext(os.path.basename(source_path))[0]
+        if self.filename_pattern:
+            # Replace placeholders in pattern
+            output_filename = self.filename_pattern.replace('{name}', base_name).replace('{num}', str(file_num))
+            if not output_filename.endswith('.pdf'):
+                output_filename += '.pdf'
+        else:
+            # Use default filename
+            output_filename = base_name + ".pdf"
+        return os.path.join(self.output_dir, output_filename)
+    
+    def for_combined_part(self, suffix):
+        """Copy of the options whose combined file name ends with the given suffix"""
+        options = copy.copy(self)
+        options.combined_filename = f"{self.combined_filename}_{suffix}"
+        return options
+    
+    def combined_output_path(self):
+        """Build the output path for a combined PDF"""
+        output_filename = self.combined_filename
+        if not output_filename.endswith('.pdf'):
+            output_filename += '.pdf'
+        return os.path.join(self.output_dir, output_filename)
@@ -0,0 +1,162 @@
+"""
+Process pool for converting individual files in parallel
+"""
+
+import os
+from collections import deque, namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from conversion_metrics import PROFILER
+from image_converter import ImageConverter
+from epub_converter import EPUBConverter
+
+# Outcome of one file; either output_path or error is None. pages is the number of pages written
+# and task_id the ID the file was submitted with
+ConversionResult = namedtuple("ConversionResult", "file_type file_path output_path error skipped options pages task_id")
+
+def default_worker_count():
+    """Number of worker processes to use when none is configured"""
+    return os.cpu_count() or 1
+
+def convert_file(file_type, file_path, file_num, options):
+    """Convert a single file and return (output path, page count) (runs in a worker process)"""
+    if file_type == "image":
+        converter = ImageConverter(options)
+    elif file_type == "epub":
+        converter = EPUBConverter(options)
+    else:
+        raise ValueError(f"Unknown file type: {file_type}")
+    
+    with PROFILER.stage("file", file_type=file_type, file=file_path) as stage:
+        output_path = converter.convert_to_pdf(file_path, file_num)
+        stage.add(pages=converter.page_count)
+    return output_path, converter.page_count
+
+class ConversionPool:
+    """
+    Runs individual file conversions on a pool of worker processes.
+    Results are handed back in the order the files were submitted.
+    Two inputs can map to the same output (a/page001.png and b/page001.png);
+    callers check is_writing() and hand back results until the earlier file is
+    done before submitting the later one, so the last file wins as it does
+    when converting one file at a time.
+    """
+    
+    def __init__(self, max_workers=None):
+        """Initialize the pool; worker processes are started on first use"""
+        self.max_workers = max_workers or default_worker_count()
+        self._executor = None
+        self._pending = deque()
+        # Output path -> number of submitted files writing it that haven't been handed back
+        self._writing = {}
+    
+    def set_max_workers(self, max_workers):
+        """Change the number of worker processes used for the next submissions"""
+        max_workers = max(1, int(max_workers))
+        if max_workers != self.max_workers and not self._pending:
+            self._shutdown_executor()
+        self.max_workers = max_workers
+    
+    def submit(self, file_type, file_path, file_num, options, task_id=None):
+        """Queue a single file for conversion in a worker process"""
+        executor = self._get_executor()
+        future = executor.submit(convert_file, file_type, file_path, file_num, options)
+        output_path = options.output_path(file_path, file_num)
+        self._writing[output_path] = self._writing.get(output_path, 0) + 1
+        self._pending.append((file_type, file_path, options, future, executor, task_id, output_path))
+    
+    def map_ordered(self, fn, work):
+        """
+        Run fn(*args) in the worker processes for each (key, args) in work and
+        yield (key, result, error) in the same order; one of result and error is None.
+        Only as many calls as is_full() allows are in flight, so finished results
+        waiting for an earlier one form a bounded reorder buffer.
+        """
+        window = deque()
+        try:
+            for key, args in work:
+                executor = self._get_executor()
+                window.append((key, executor.submit(fn, *args), executor))
+                while len(window) >= self.max_workers * 2:
+                    yield self._collect(*window.popleft())
+            while window:
+                yield self._collect(*window.popleft())
+        finally:
+            for _, future, _ in window:
+                future.cancel()
+    
+    def add_skipped(self, file_type, file_path, output_path, options, task_id=None):
+        """Queue a file that needs no conversion so it is handed back in order with the others"""
+        future = Future()
+        future.set_result((output_path, 0))
+        self._pending.append((file_type, file_path, options, future, None, task_id, None))
+    
+    def has_pending(self):
+        """Check whether any submitted file has not been handed back yet"""
+        return bool(self._pending)
+    
+    def is_full(self):
+        """Check whether enough files are in flight to keep every worker busy"""
+        return len(self._pending) >= self.max_workers * 2
+    
+    def is_writing(self, output_path):
+        """Check whether a submitted file that hasn't been handed back yet writes to output_path"""
+        return output_path in self._writing
+    
+    def next_result(self):
+        """Wait for the oldest submitted file and return its ConversionResult"""
+        file_type, file_path, options, future, executor, task_id, output_path = self._pending.popleft()
+        if output_path is not None:
+            self._writing[output_path] -= 1
+            if not self._writing[output_path]:
+                del self._writing[output_path]
+        skipped = executor is None
+        try:
+            output_path, pages = future.result()
+            return ConversionResult(file_type, file_path, output_path, None, skipped, options, pages, task_id)
+        except BrokenProcessPool as e:
+            # A worker died; start a fresh pool for the files submitted later
+            if executor is self._executor:
+                self._shutdown_executor()
+            error = Exception(f"Error converting {file_path}: worker process crashed ({str(e)})")
+            return ConversionResult(file_type, file_path, None, error, skipped, options, 0, task_id)
+        except Exception as e:
+            return ConversionResult(file_type, file_path, None, e, skipped, options, 0, task_id)
+    
+    def shutdown(self, wait=False):
+        """Cancel files that have not started and stop the worker processes, waiting for them to exit if wait is true"""
+        for _, _, _, future, _, _, _ in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._writing.clear()
+        # Also drop work queued by map_ordered, so nothing keeps the process alive
+        self._shutdown_executor(cancel_futures=True, wait=wait)
+    
+    def _collect(self, key, future, executor):
+        """Wait for one map_ordered call and return (key, result, error)"""
+        try:
+            return key, future.result(), None
+        except BrokenProcessPool as e:
+            # A worker died; start a fresh pool for the calls submitted later
+            if executor is self._executor:
+                self._shutdown_executor()
+            return key, None, Exception(f"worker process crashed ({str(e)})")
+        except Exception as e:
+            return key, None, e
+    
+    def _get_executor(self):
+        """Return the process pool, starting it if needed"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+    
+    def _shutdown_executor(self, cancel_futures=False, wait=False):
+        """Stop the worker processes (without waiting for them unless asked), cancelling work not yet started if asked"""
+        if self._executor is not None:
+            try:
+                self._executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+            except TypeError:
+                # Python before 3.9 has no cancel_futures; queued work then still runs
+                self._executor.shutdown(wait=wait)
+            self._executor = None
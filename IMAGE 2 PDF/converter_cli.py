@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Command-line entry point for batch conversions without the GUI.
+Prints a JSON summary on stdout; progress and errors go to stderr.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from conversion_options import ConversionOptions, PAGE_SIZES, DEFAULT_MAX_DPI, PDF_PROFILES
+from conversion_pool import default_worker_count
+from batch_converter import BatchConverter, collect_files
+from conversion_cache import ConversionCache
+
+def parse_args(argv=None):
+    """Parse the command-line arguments"""
+    parser = argparse.ArgumentParser(description="Convert images and EPUB files to PDF.")
+    parser.add_argument("inputs", nargs="+",
+                        help="files, folders or glob patterns (quote patterns such as 'scans/**/*.jpg')")
+    parser.add_argument("-o", "--output-dir", default=os.getcwd(),
+                        help="directory for the PDF files (default: current directory)")
+    parser.add_argument("-j", "--jobs", type=int, default=default_worker_count(),
+                        help="number of worker processes (default: one per CPU core)")
+    parser.add_argument("-p", "--pattern", default="",
+                        help="output filename pattern, e.g. 'scan_{num}' or '{name}_converted'")
+    parser.add_argument("--combine", metavar="NAME",
+                        help="combine all images (and all EPUB files) into NAME.pdf")
+    parser.add_argument("--page-size", choices=list(PAGE_SIZES), default="letter",
+                        help="page size (default: letter)")
+    parser.add_argument("--quality", type=int, default=100,
+                        help="JPEG quality for re-encoded images, 1-100 (default: 100)")
+    parser.add_argument("--max-dpi", type=int, default=DEFAULT_MAX_DPI,
+                        help=f"downsample images above this resolution (default: {DEFAULT_MAX_DPI})")
+    parser.add_argument("--profile", choices=PDF_PROFILES, default="standard",
+                        help="PDF output profile; 'compact' uses compressed object streams (default: standard)")
+    parser.add_argument("--linearize", action="store_true",
+                        help="write combined PDFs linearized (fast web view), so remote viewers show page 1 first")
+    parser.add_argument("--timings-log", metavar="FILE",
+                        help="append per-stage timing events to FILE as JSON lines")
+    parser.add_argument("--force", action="store_true",
+                        help="convert every file, even if it is unchanged since the last run")
+    parser.add_argument("--verify-content", action="store_true",
+                        help="compare content hashes of inputs whose modification time changed")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="don't print progress to stderr")
+    args = parser.parse_args(argv)
+    
+    if not 1 <= args.quality <= 100:
+        parser.error("--quality must be between 1 and 100")
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.max_dpi < 1:
+        parser.error("--max-dpi must be at least 1")
+    return args
+
+def main(argv=None):
+    """Run a batch conversion and return the process exit code"""
+    args = parse_args(argv)
+    
+    options = ConversionOptions(
+        output_dir=os.path.abspath(args.output_dir),
+        page_size=args.page_size,
+        quality=args.quality,
+        combined_filename=args.combine or "combined_document",
+        filename_pattern=args.pattern,
+        max_dpi=args.max_dpi,
+        linearize=args.linearize,
+        pdf_profile=args.profile,
+        timings_log=os.path.abspath(args.timings_log) if args.timings_log else None
+    )
+    
+    files = collect_files(args.inputs)
+    if not files:
+        print("No supported files found.", file=sys.stderr)
+        return 2
+    
+    status_callback = None if args.quiet else (lambda message: print(message, file=sys.stderr))
+    cache = None if args.force else ConversionCache(options.output_dir, verify_content=args.verify_content)
+    converter = BatchConverter(options, jobs=args.jobs, status_callback=status_callback, cache=cache)
+    summary = converter.convert(files, combine=bool(args.combine))
+    
+    json.dump(summary, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    
+    # Exit code 1 tells a scheduler that some files failed
+    return 1 if summary["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,264 +3,444 @@ EPUB to PDF conversion functionality
 """
 
 import os
-import ebooklib
-from ebooklib import epub
-from bs4 import BeautifulSoup
-from reportlab.lib.pagesizes import letter, A4, legal
-from reportlab.lib.units import inch
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from reportlab import rl_config
 from reportlab.pdfgen import canvas
 
+from conversion_metrics import PROFILER
+from epub_images import EPUBImageCache
+from epub_reader import EPUBReader, read_member
+from html_extractor import extract_blocks
+from pdf_linearizer import linearize_file
+from pdf_writer import StreamingPDFWriter, atomic_output
+from text_layout import TextLayout, Paginator, MARGIN
+
+# Fonts (name, size) of headings and paragraphs
+HEADING_FONT = ("Helvetica-Bold", 14)
+BODY_FONT = ("Helvetica", 11)
+
+# Pages drawn into one fragment PDF by a worker process in parallel conversions
+FRAGMENT_PAGES = 50
+
+# Word widths cached for the layouts done in this process (used by worker processes)
+PROCESS_LAYOUT = TextLayout()
+
+# Image caches of this process by settings fingerprint (used by worker processes)
+PROCESS_IMAGES = {}
+
+def layout_document(content, layout, max_width, place_image=None, document=None):
+    """
+    Extract the headings, paragraphs and images of one XHTML document and wrap the paragraphs.
+    place_image maps an image's src to (key, width, height), or None to leave it out.
+    Returns a list of ("heading", text), ("paragraph", lines) and ("image", key, width, height).
+    document names the document in timing events.
+    """
+    if not PROFILER.enabled:
+        return extract_layout(content, layout, max_width, place_image)
+    
+    # Parsing and wrapping are interleaved, so the wrapping is timed call by call
+    timed_layout = TimedLayout(layout)
+    start = time.perf_counter()
+    blocks = extract_layout(content, timed_layout, max_width, place_image)
+    seconds = time.perf_counter() - start
+    PROFILER.event("stage", stage="parse", seconds=round(seconds - timed_layout.seconds, 6),
+                   document=document, bytes_in=len(content), blocks=len(blocks))
+    PROFILER.event("stage", stage="wrap", seconds=round(timed_layout.seconds, 6), document=document)
+    return blocks
+
+def extract_layout(content, layout, max_width, place_image):
+    """Blocks of layout_document, without timing"""
+    blocks = []
+    # Extract text content, streaming through the document
+    for tag, text in extract_blocks(content):
+        if tag == 'img':
+            placed = place_image(text) if place_image else None
+            if placed:
+                blocks.append(("image", *placed))
+            continue
+        if not text.strip():
+            continue
+        if tag.startswith('h'):
+            blocks.append(("heading", text))
+        else:
+            # Split long text into multiple lines
+            blocks.append(("paragraph", layout.wrap(text, BODY_FONT[0], BODY_FONT[1], max_width)))
+    return blocks
+
+def layout_epub_document(epub_path, member, options):
+    """Lay out one document of an EPUB (runs in a worker process)"""
+    PROFILER.configure(options.timings_log)
+    page_size = options.get_page_size()
+    place_image = image_placer(process_images(options), epub_path, member, page_size)
+    return layout_document(read_member(epub_path, member), PROCESS_LAYOUT, page_size[0] - 2 * MARGIN,
+                           place_image, member)
+
+def render_fragment(pages, options, fragment_path):
+    """Draw pages placed by a Paginator into a PDF of their own (runs in a worker process)"""
+    PROFILER.configure(options.timings_log)
+    with reportlab_profile(options):
+        c = canvas.Canvas(fragment_path, pagesize=options.get_page_size())
+        draw_pages(c, pages, process_images(options))
+        save_canvas(c)
+    return fragment_path
+
+def render_book_fragment(epub_path, options, fragment_path):
+    """Render one book of a combined PDF, title page included, to a PDF of its own (runs in a worker process)"""
+    page_size = options.get_page_size()
+    with reportlab_profile(options):
+        c = canvas.Canvas(fragment_path, pagesize=page_size)
+        paginator = Paginator(page_size)
+        converter = EPUBConverter(options)
+        converter._add_book(c, paginator, epub_path, page_size)
+        paginator.finish()
+        draw_pages(c, paginator.take_pages(), converter.images)
+        save_canvas(c)
+    return fragment_path
+
+@contextmanager
+def reportlab_profile(options):
+    """Apply the output profile to the canvases drawn and saved inside the block"""
+    use_a85 = rl_config.useA85
+    if options.compact:
+        # Binary streams; ASCII85 makes images and page contents a quarter larger
+        rl_config.useA85 = 0
+    try:
+        yield
+    finally:
+        rl_config.useA85 = use_a85
+
+def process_images(options):
+    """Image cache of this process for the given settings"""
+    fingerprint = options.settings_fingerprint()
+    if fingerprint not in PROCESS_IMAGES:
+        PROCESS_IMAGES[fingerprint] = EPUBImageCache(options)
+    return PROCESS_IMAGES[fingerprint]
+
+def image_placer(images, epub_path, document, page_size):
+    """Return a function that sizes the images of a document to fit the text column"""
+    max_width = page_size[0] - 2 * MARGIN
+    max_height = page_size[1] - 2 * MARGIN
+    return lambda src: images.place(epub_path, document, src, max_width, max_height)
+
+def save_canvas(c, output_path=None):
+    """
+    Write a canvas's PDF file; reportlab builds and writes the whole document here.
+    With output_path, the document goes there via a temporary file instead.
+    """
+    with PROFILER.stage("save", pages=c.getPageNumber() - 1):
+        if output_path is None:
+            c.save()
+            return
+        data = c.getpdfdata()
+        with atomic_output(output_path) as temp_path:
+            with open(temp_path, "wb") as f:
+                f.write(data)
+
+def draw_pages(c, pages, images):
+    """Draw pages placed by a Paginator on a canvas, ending each with a page break"""
+    if not pages:
+        return
+    with PROFILER.stage("draw", pages=len(pages)):
+        draw_operations(c, pages, images)
+
+def draw_operations(c, pages, images):
+    """Draw the operations of each page, without timing"""
+    for operations in pages:
+        for operation in operations:
+            kind, y_position, content = operation[:3]
+            if kind == "heading":
+                # Make headings bold and larger
+                c.setFont(*HEADING_FONT)
+                c.drawString(MARGIN, y_position, content)
+            elif kind == "text":
+                if not operation[3]:
+                    c.setFont(*BODY_FONT)
+                text_obj = c.beginText(MARGIN, y_position)
+                text_obj.setFont(*BODY_FONT)
+                for line in content:
+                    text_obj.textLine(line)
+                c.drawText(text_obj)
+            elif kind == "title":
+                c.setFont(operation[3], operation[4])
+                c.drawString(MARGIN, y_position, content)
+            elif kind == "image":
+                x_position, width, height = operation[3:]
+                c.drawImage(images.reader(content, width, height), x_position, y_position,
+                            width, height, mask="auto")
+        c.showPage()
+
+class TimedLayout:
+    """TextLayout wrapper adding up the time spent wrapping lines"""
+    
+    def __init__(self, layout):
+        """Wrap a TextLayout"""
+        self.layout = layout
+        self.seconds = 0
+    
+    def wrap(self, *args):
+        """TextLayout.wrap, timed"""
+        start = time.perf_counter()
+        try:
+            return self.layout.wrap(*args)
+        finally:
+            self.seconds += time.perf_counter() - start
+
 class EPUBConverter:
     """
     Handles conversion of EPUB files to PDF
     """
     
-    def __init__(self, app):
-        """Initialize with reference to the main application"""
-        self.app = app
+    def __init__(self, options, status_callback=None):
+        """Initialize with the conversion options and an optional status callback"""
+        self.options = options
+        self.status_callback = status_callback
+        # Word widths and images are cached across documents and books
+        self.layout = TextLayout()
+        self.images = EPUBImageCache(options)
+        # (path, error message) for each file skipped by the last combined conversion
+        self.errors = []
+        # Pages written by the last conversion
+        self.page_count = 0
+        PROFILER.configure(options.timings_log)
     
-    def convert_to_pdf(self, epub_path):
-        """Convert a single EPUB file to PDF"""
+    def convert_to_pdf(self, epub_path, file_num=1, pool=None):
+        """
+        Convert a single EPUB file to PDF and return the output path.
+        With a ConversionPool of more than one worker, chapters are laid out and
+        pages drawn in parallel, then stitched together in reading order.
+        """
         try:
             # Generate output path
-            if self.app.custom_filename.get() and self.app.override_filename.get():
-                # Use custom filename pattern
-                base_name = os.path.splitext(os.path.basename(epub_path))[0]
-                file_num = 0
-                
-                # Find the index if possible
-                for i, (path, file_type) in enumerate(self.app.file_paths):
-                    if path == epub_path and file_type == "epub":
-                        file_num = i
-                        break
-                
-                # Replace placeholders in pattern
-                output_filename = self.app.override_filename.get().replace('{name}', base_name).replace('{num}', str(file_num + 1))
-                if not output_filename.endswith('.pdf'):
-                    output_filename += '.pdf'
-            else:
-                # Use default filename
-                output_filename = os.path.splitext(os.path.basename(epub_path))[0] + ".pdf"
-                
-            output_path = os.path.join(self.app.output_dir, output_filename)
+            output_path = self.options.output_path(epub_path, file_num)
             
             # Get page size
-            page_size = self._get_page_size()
+            page_size = self.options.get_page_size()
             
-            # Read EPUB
-            book = epub.read_epub(epub_path)
-            
-            # Create PDF
-            c = canvas.Canvas(output_path, pagesize=page_size)
-            pdf_width, pdf_height = page_size
-            
-            # Process EPUB content
-            items = list(book.get_items_of_type(ebooklib.ITEM_DOCUMENT))
-            line_height = 14
-            margin = 50
-            y_position = pdf_height - margin
-            
-            for item in items:
-                content = item.get_content().decode('utf-8')
-                soup = BeautifulSoup(content, 'html.parser')
-                
-                # Extract text content
-                for paragraph in soup.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
-                    text = paragraph.get_text()
-                    if not text.strip():
-                        continue
-                        
-                    # Check if we need a new page
-                    if y_position < margin + line_height:
-                        c.showPage()
-                        y_position = pdf_height - margin
-                    
-                    # Add text to PDF
-                    if paragraph.name.startswith('h'):
-                        # Make headings bold and larger
-                        c.setFont("Helvetica-Bold", 14)
-                        c.drawString(margin, y_position, text)
-                        y_position -= line_height * 2
-                    else:
-                        c.setFont("Helvetica", 11)
-                        # Handle text wrapping
-                        text_obj = c.beginText(margin, y_position)
-                        text_obj.setFont("Helvetica", 11)
-                        
-                        # Split long text into multiple lines
-                        words = text.split()
-                        current_line = ""
-                        
-                        for word in words:
-                            test_line = current_line + " " + word if current_line else word
-                            if c.stringWidth(test_line, "Helvetica", 11) < (pdf_width - 2 * margin):
-                                current_line = test_line
-                            else:
-                                text_obj.textLine(current_line)
-                                y_position -= line_height
-                                
-                                # Check if we need a new page
-                                if y_position < margin + line_height:
-                                    c.drawText(text_obj)
-                                    c.showPage()
-                                    y_position = pdf_height - margin
-                                    text_obj = c.beginText(margin, y_position)
-                                    text_obj.setFont("Helvetica", 11)
-                                
-                                current_line = word
-                        
-                        # Add the last line
-                        if current_line:
-                            text_obj.textLine(current_line)
-                            y_position -= line_height
-                        
-                        c.drawText(text_obj)
-                    
-                    # Add some space between paragraphs
-                    y_position -= line_height
-            
-            # Save the PDF
-            c.save()
-            return True
+            if pool is not None and pool.max_workers > 1:
+                self._convert_parallel(epub_path, output_path, page_size, pool)
+            else:
+                with reportlab_profile(self.options):
+                    self._convert_serial(epub_path, output_path, page_size)
+            return output_path
             
         except Exception as e:
             raise Exception(f"Error converting {epub_path}: {str(e)}")
     
-    def convert_multiple_to_pdf(self, epub_paths):
-        """Convert multiple EPUB files to a single PDF"""
+    def convert_multiple_to_pdf(self, epub_paths, pool=None):
+        """
+        Convert multiple EPUB files to a single PDF and return the output path.
+        With a ConversionPool of more than one worker, each book is rendered to a
+        PDF of its own on the workers and the pages are copied into the output in order.
+        """
+        self.errors = []
         try:
             # Generate output path
-            output_filename = f"{self.app.combined_filename.get()}.pdf"
-            if not output_filename.endswith('.pdf'):
-                output_filename += '.pdf'
-                
-            output_path = os.path.join(self.app.output_dir, output_filename)
+            output_path = self.options.combined_output_path()
             
             # Get page size
-            page_size = self._get_page_size()
+            page_size = self.options.get_page_size()
+            
+            if pool is not None and pool.max_workers > 1:
+                self._combine_parallel(epub_paths, output_path, page_size, pool)
+            else:
+                with reportlab_profile(self.options):
+                    self._combine_serial(epub_paths, output_path, page_size)
+            return self._finish_combined(output_path)
             
+        except Exception as e:
+            raise Exception(f"Error creating combined PDF: {str(e)}")
+    
+    def _convert_serial(self, epub_path, output_path, page_size):
+        """Draw a book on a single canvas, one document at a time"""
+        # Open EPUB (only the package file is read here)
+        with EPUBReader(epub_path) as book:
             # Create PDF
             c = canvas.Canvas(output_path, pagesize=page_size)
-            pdf_width, pdf_height = page_size
-            line_height = 14
-            margin = 50
-            y_position = pdf_height - margin
+            paginator = Paginator(page_size)
             
-            # Process each EPUB
-            for epub_idx, epub_path in enumerate(epub_paths):
-                try:
-                    # Read EPUB
-                    book = epub.read_epub(epub_path)
-                    
-                    # Add title page for this EPUB
-                    epub_title = os.path.splitext(os.path.basename(epub_path))[0]
-                    c.setFont("Helvetica-Bold", 18)
-                    c.drawString(margin, pdf_height - 100, f"Book: {epub_title}")
-                    c.setFont("Helvetica", 12)
-                    c.drawString(margin, pdf_height - 120, f"Source: {epub_path}")
+            # Process EPUB content, one document at a time in reading order
+            for member, content in book.iter_documents():
+                self._add_document(paginator, epub_path, member, content, page_size)
+                draw_pages(c, paginator.take_pages(), self.images)
+            
+            paginator.finish()
+            draw_pages(c, paginator.take_pages(), self.images)
+        
+        # Save the PDF
+        self.page_count = c.getPageNumber() - 1
+        save_canvas(c, output_path)
+    
+    def _combine_serial(self, epub_paths, output_path, page_size):
+        """Draw every book, each after its title page, on a single canvas; books that fail are left out"""
+        # Create PDF
+        c = canvas.Canvas(output_path, pagesize=page_size)
+        paginator = Paginator(page_size)
+        
+        # Process each EPUB
+        for epub_idx, epub_path in enumerate(epub_paths):
+            try:
+                # Update status
+                epub_title = os.path.splitext(os.path.basename(epub_path))[0]
+                self._report_status(f"Processing EPUB {epub_idx+1} of {len(epub_paths)}: {epub_title}")
+                
+                self._add_book(c, paginator, epub_path, page_size)
+                
+                # Add page break after each EPUB
+                if epub_idx < len(epub_paths) - 1:
+                    paginator.new_page()
                     
-                    # Add page break after title
-                    c.showPage()
-                    y_position = pdf_height - margin
+            except Exception as e:
+                # Log error but continue with next EPUB
+                self._record_error(epub_path, e)
+                continue
+        
+        # Save the PDF
+        paginator.finish()
+        draw_pages(c, paginator.take_pages(), self.images)
+        self.page_count = c.getPageNumber() - 1
+        save_canvas(c, output_path)
+    
+    def _combine_parallel(self, epub_paths, output_path, page_size, pool):
+        """
+        Render each book with its title page to a temporary PDF on the worker
+        processes and copy the pages into the output in order; books that fail are left out
+        """
+        writer = StreamingPDFWriter(output_path, page_size, **self.options.writer_options(combined=True))
+        try:
+            with tempfile.TemporaryDirectory(prefix=".fragments_", dir=os.path.dirname(output_path)) as fragment_dir:
+                work = (
+                    ((epub_idx, epub_path), (epub_path, self.options, os.path.join(fragment_dir, f"{epub_idx:06d}.pdf")))
+                    for epub_idx, epub_path in enumerate(epub_paths)
+                )
+                for (epub_idx, epub_path), fragment_path, error in pool.map_ordered(render_book_fragment, work):
+                    if error is not None:
+                        # Log error but continue with next EPUB
+                        self._record_error(epub_path, error)
+                        continue
                     
                     # Update status
-                    self.app.root.after(0, lambda idx=epub_idx, total=len(epub_paths): 
-                                      self.app.status_var.set(f"Processing EPUB {idx+1} of {total}: {epub_title}"))
-                    
-                    # Process EPUB content
-                    items = list(book.get_items_of_type(ebooklib.ITEM_DOCUMENT))
-                    
-                    for item in items:
-                        content = item.get_content().decode('utf-8')
-                        soup = BeautifulSoup(content, 'html.parser')
-                        
-                        # Extract text content
-                        for paragraph in soup.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
-                            text = paragraph.get_text()
-                            if not text.strip():
-                                continue
-                                
-                            # Check if we need a new page
-                            if y_position < margin + line_height:
-                                c.showPage()
-                                y_position = pdf_height - margin
-                            
-                            # Add text to PDF
-                            if paragraph.name.startswith('h'):
-                                # Make headings bold and larger
-                                c.setFont("Helvetica-Bold", 14)
-                                c.drawString(margin, y_position, text)
-                                y_position -= line_height * 2
-                            else:
-                                c.setFont("Helvetica", 11)
-                                # Handle text wrapping
-                                text_obj = c.beginText(margin, y_position)
-                                text_obj.setFont("Helvetica", 11)
-                                
-                                # Split long text into multiple lines
-                                words = text.split()
-                                current_line = ""
-                                
-                                for word in words:
-                                    test_line = current_line + " " + word if current_line else word
-                                    if c.stringWidth(test_line, "Helvetica", 11) < (pdf_width - 2 * margin):
-                                        current_line = test_line
-                                    else:
-                                        text_obj.textLine(current_line)
-                                        y_position -= line_height
-                                        
-                                        # Check if we need a new page
-                                        if y_position < margin + line_height:
-                                            c.drawText(text_obj)
-                                            c.showPage()
-                                            y_position = pdf_height - margin
-                                            text_obj = c.beginText(margin, y_position)
-                                            text_obj.setFont("Helvetica", 11)
-                                        
-                                        current_line = word
-                                
-                                # Add the last line
-                                if current_line:
-                                    text_obj.textLine(current_line)
-                                    y_position -= line_height
-                                
-                                c.drawText(text_obj)
-                            
-                            # Add some space between paragraphs
-                            y_position -= line_height
+                    epub_title = os.path.splitext(os.path.basename(epub_path))[0]
+                    self._report_status(f"Processing EPUB {epub_idx+1} of {len(epub_paths)}: {epub_title}")
                     
-                    # Add page break after each EPUB
-                    if epub_idx < len(epub_paths) - 1:
-                        c.showPage()
-                        y_position = pdf_height - margin
-                        
-                except Exception as e:
-                    # Log error but continue with next EPUB
-                    print(f"Error processing {epub_path}: {str(e)}")
-                    continue
-            
-            # Save the PDF
-            c.save()
-            
-            # Show success message
-            self.app.root.after(0, lambda: messagebox.showinfo("Success", 
-                                f"Combined PDF created successfully at:\n{output_path}"))
+                    self._merge_fragment(writer, fragment_path)
+        except Exception:
+            writer.abort()
+            raise
+        
+        self._close_writer(writer)
+    
+    def _add_book(self, c, paginator, epub_path, page_size):
+        """Place a book's title page and text on the pages, drawing each page once it is full"""
+        # Open EPUB (only the package file is read here)
+        with EPUBReader(epub_path) as book:
+            # Add title page for this EPUB
+            epub_title = os.path.splitext(os.path.basename(epub_path))[0]
+            paginator.add_title(100, f"Book: {epub_title}", "Helvetica-Bold", 18)
+            paginator.add_title(120, f"Source: {epub_path}", "Helvetica", 12)
             
-            return True
+            # Add page break after title
+            paginator.new_page()
             
-        except Exception as e:
-            raise Exception(f"Error creating combined PDF: {str(e)}")
+            # Process EPUB content, one document at a time in reading order
+            for member, content in book.iter_documents():
+                self._add_document(paginator, epub_path, member, content, page_size)
+                draw_pages(c, paginator.take_pages(), self.images)
     
-    def _get_page_size(self):
-        """Get the selected page size"""
-        page_size_dict = {
-            "letter": letter,
-            "A4": A4,
-            "legal": legal,
-            "tabloid": (11*inch, 17*inch)  # Define tabloid size manually
-        }
-        return page_size_dict.get(self.app.page_size.get(), letter)
-
-
-# Import at the end to avoid circular imports
-from tkinter import messagebox
\ No newline at end of file
+    def _convert_parallel(self, epub_path, output_path, page_size, pool):
+        """
+        Lay out the chapters on the worker processes, break them into pages here
+        (page breaks depend on everything before them), draw runs of pages into
+        fragment PDFs on the workers and copy the fragments into the output in order
+        """
+        with EPUBReader(epub_path) as book:
+            members = book.spine_documents()
+        
+        writer = StreamingPDFWriter(output_path, page_size, **self.options.writer_options())
+        try:
+            with tempfile.TemporaryDirectory(prefix=".fragments_", dir=os.path.dirname(output_path)) as fragment_dir:
+                layouts = pool.map_ordered(layout_epub_document,
+                                           ((member, (epub_path, member, self.options)) for member in members))
+                fragments = self._fragment_work(layouts, page_size, fragment_dir)
+                for fragment_path, _, error in pool.map_ordered(render_fragment, fragments):
+                    if error is not None:
+                        raise error
+                    self._merge_fragment(writer, fragment_path)
+                    self._report_status(f"{os.path.basename(epub_path)}: {writer.page_count} pages written")
+        except Exception:
+            writer.abort()
+            raise
+        
+        self._close_writer(writer)
+    
+    def _merge_fragment(self, writer, fragment_path):
+        """Copy the pages of a fragment PDF into the output and delete the fragment"""
+        with PROFILER.stage("merge", fragment=os.path.basename(fragment_path)) as stage:
+            pages_before = writer.page_count
+            writer.add_pdf_pages(fragment_path)
+            stage.add(pages=writer.page_count - pages_before, bytes_out=writer.bytes_written)
+        os.remove(fragment_path)
+    
+    def _close_writer(self, writer):
+        """Finish a PDF assembled from fragments"""
+        with PROFILER.stage("close", pages=writer.page_count):
+            writer.close()
+        self.page_count = writer.page_count
+    
+    def _fragment_work(self, layouts, page_size, fragment_dir):
+        """
+        Break laid-out chapters into pages and yield the work for render_fragment,
+        FRAGMENT_PAGES pages at a time, keyed by the fragment's path
+        """
+        paginator = Paginator(page_size)
+        fragment_count = 0
+        
+        for _, blocks, error in layouts:
+            if error is not None:
+                raise error
+            self._add_blocks(paginator, blocks)
+            while len(paginator.pages) >= FRAGMENT_PAGES:
+                fragment_count += 1
+                fragment_path = os.path.join(fragment_dir, f"{fragment_count:06d}.pdf")
+                yield fragment_path, (paginator.take_pages(FRAGMENT_PAGES), self.options, fragment_path)
+        
+        paginator.finish()
+        if paginator.pages:
+            fragment_path = os.path.join(fragment_dir, f"{fragment_count + 1:06d}.pdf")
+            yield fragment_path, (paginator.take_pages(), self.options, fragment_path)
+    
+    def _add_document(self, paginator, epub_path, member, content, page_size):
+        """Lay out one XHTML document of a book and place it on the pages"""
+        max_width = page_size[0] - 2 * MARGIN
+        place_image = image_placer(self.images, epub_path, member, page_size)
+        self._add_blocks(paginator, layout_document(content, self.layout, max_width, place_image, member))
+    
+    def _add_blocks(self, paginator, blocks):
+        """Place laid-out headings, paragraphs and images on the pages"""
+        with PROFILER.stage("paginate", blocks=len(blocks)):
+            for kind, *content in blocks:
+                if kind == "heading":
+                    paginator.add_heading(*content)
+                elif kind == "image":
+                    paginator.add_image(*content)
+                else:
+                    paginator.add_paragraph(*content)
+    
+    def _finish_combined(self, output_path):
+        """Linearize a finished combined PDF if the options ask for it, and return its path"""
+        if self.options.linearize:
+            with PROFILER.stage("linearize", file=output_path):
+                linearize_file(output_path)
+        return output_path
+    
+    def _record_error(self, epub_path, error):
+        """Log a book that could not be added to a combined PDF"""
+        print(f"Error processing {epub_path}: {str(error)}", file=sys.stderr)
+        self.errors.append((epub_path, str(error)))
+    
+    def _report_status(self, message):
+        """Pass a status message to the callback, if any"""
+        if self.status_callback:
+            self.status_callback(message)
@@ -0,0 +1,134 @@
+"""
+Decoded and downsampled images for EPUB to PDF conversion
+"""
+
+import io
+import posixpath
+import zipfile
+from collections import OrderedDict
+from urllib.parse import unquote, urlsplit
+from PIL import Image
+from reportlab.lib.utils import ImageReader
+
+from conversion_metrics import PROFILER
+from epub_reader import read_member
+from image_converter import ORIENTATION_TAG, ORIENTATION_TRANSPOSES, TRANSPOSED_ORIENTATIONS
+
+# Size of a CSS pixel in points; images are shown at their natural size unless the column is narrower
+POINTS_PER_PIXEL = 72 / 96
+
+def resolve_href(document, href):
+    """Archive path of a file referenced from a document, or None for data: and external URLs"""
+    parts = urlsplit(href)
+    if parts.scheme or parts.netloc or not parts.path:
+        return None
+    return posixpath.normpath(posixpath.join(posixpath.dirname(document), unquote(parts.path)))
+
+class EPUBImageCache:
+    """
+    Images of EPUB books, keyed by their archive path (the manifest href).
+    Each image is decoded, downsampled to the DPI cap for its size on the page
+    and re-encoded once; the ImageReader is then reused for every page that shows it,
+    which lets the canvas embed it in the PDF only once.
+    """
+    
+    def __init__(self, options, max_images=32):
+        """Initialize with the conversion options (max DPI and JPEG quality)"""
+        self.options = options
+        self.max_images = max_images
+        # (epub path, member) -> (width, height) in pixels as shown, or None if unreadable
+        self._sizes = {}
+        # (epub path, member, width, height) -> ImageReader, least recently used first
+        self._readers = OrderedDict()
+    
+    def place(self, epub_path, document, href, max_width, max_height):
+        """
+        Size an image referenced from a document to fit the text column, never enlarging it.
+        Returns ((epub path, member), width, height) in points, or None if the image cannot be shown.
+        """
+        member = resolve_href(document, href)
+        if member is None:
+            return None
+        size = self._size(epub_path, member)
+        if size is None:
+            return None
+        
+        width = size[0] * POINTS_PER_PIXEL
+        height = size[1] * POINTS_PER_PIXEL
+        ratio = min(1, max_width / width, max_height / height)
+        return (epub_path, member), width * ratio, height * ratio
+    
+    def reader(self, key, draw_width, draw_height):
+        """ImageReader for an image placed by place(), prepared on first use"""
+        cache_key = (*key, round(draw_width, 3), round(draw_height, 3))
+        reader = self._readers.get(cache_key)
+        if reader is not None:
+            self._readers.move_to_end(cache_key)
+            return reader
+        
+        with PROFILER.stage("image", file=key[1], width=round(draw_width), height=round(draw_height)):
+            reader = ImageReader(self._prepare(read_member(*key), draw_width, draw_height))
+        self._readers[cache_key] = reader
+        if len(self._readers) > self.max_images:
+            self._readers.popitem(last=False)
+        return reader
+    
+    def _size(self, epub_path, member):
+        """Pixel size of an image as it is meant to be shown, read from its header"""
+        key = (epub_path, member)
+        if key not in self._sizes:
+            try:
+                # Only the header is read; the archive member is streamed, not loaded
+                with zipfile.ZipFile(epub_path) as archive, archive.open(member) as f, Image.open(f) as img:
+                    width, height = img.size
+                    if img.getexif().get(ORIENTATION_TAG, 1) in TRANSPOSED_ORIENTATIONS:
+                        width, height = height, width
+                self._sizes[key] = (width, height) if width and height else None
+            except Exception:
+                # Missing files and formats Pillow cannot read (such as SVG) are left out
+                self._sizes[key] = None
+        return self._sizes[key]
+    
+    def _prepare(self, data, draw_width, draw_height):
+        """
+        Downsample and rotate encoded image data for its size on the page.
+        Returns a file object holding a JPEG (passed through when it needs no
+        changes) or a PIL image for images with transparency.
+        """
+        # Largest pixel size that stays within the DPI cap (drawing sizes are in points)
+        max_width = max(1, round(draw_width / 72 * self.options.max_dpi))
+        max_height = max(1, round(draw_height / 72 * self.options.max_dpi))
+        
+        img = Image.open(io.BytesIO(data))
+        orientation = img.getexif().get(ORIENTATION_TAG, 1)
+        if orientation in TRANSPOSED_ORIENTATIONS:
+            max_width, max_height = max_height, max_width
+        
+        if (img.format == "JPEG" and img.mode in ("RGB", "L") and orientation not in ORIENTATION_TRANSPOSES
+                and img.width <= max_width and img.height <= max_height):
+            return io.BytesIO(data)
+        
+        # Let the JPEG decoder scale down while decoding
+        if img.format == "JPEG":
+            img.draft(img.mode, (max_width, max_height))
+        
+        if img.mode == "1":
+            img = img.convert("L")
+        
+        if img.width > max_width or img.height > max_height:
+            img.thumbnail((max_width, max_height), Image.LANCZOS)
+        
+        if orientation in ORIENTATION_TRANSPOSES:
+            img = img.transpose(ORIENTATION_TRANSPOSES[orientation])
+        
+        # Images with transparency stay lossless so the alpha channel survives
+        if img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info:
+            return img.convert("RGBA")
+        
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        
+        buffer = io.BytesIO()
+        img.save(buffer, "JPEG", quality=self.options.quality, optimize=True)
+        buffer.seek(0)
+        return buffer
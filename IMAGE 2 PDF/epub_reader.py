@@ -0,0 +1,95 @@
+"""
+Lazy EPUB reader that follows the spine (reading order)
+"""
+
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ElementTree
+from urllib.parse import unquote
+
+# XML namespaces used in EPUB package files
+CONTAINER_NS = "{urn:oasis:names:tc:opendocument:xmlns:container}"
+OPF_NS = "{http://www.idpf.org/2007/opf}"
+DC_NS = "{http://purl.org/dc/elements/1.1/}"
+
+# Media types of documents with text content
+DOCUMENT_MEDIA_TYPES = ("application/xhtml+xml", "text/html")
+
+def read_member(epub_path, member):
+    """Read a single file from an EPUB archive (used by worker processes)"""
+    with zipfile.ZipFile(epub_path) as archive:
+        return archive.read(member)
+
+class EPUBReader:
+    """
+    Reads an EPUB through the zip file's central directory.
+    Only the container and package (OPF) files are parsed up front;
+    each document is read from the archive when it is asked for, and
+    fonts, images and other assets are only read when they are used.
+    """
+    
+    def __init__(self, epub_path):
+        """Open the EPUB and read its manifest and spine"""
+        self.epub_path = epub_path
+        self._zip = zipfile.ZipFile(epub_path)
+        try:
+            self._read_package()
+        except Exception:
+            self._zip.close()
+            raise
+    
+    def __enter__(self):
+        """Use the reader as a context manager"""
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Close the archive when the block ends"""
+        self.close()
+    
+    def close(self):
+        """Close the archive"""
+        self._zip.close()
+    
+    def spine_documents(self):
+        """Archive paths of the text documents, in reading order"""
+        return list(self._documents)
+    
+    def read(self, member):
+        """Read one file from the archive"""
+        return self._zip.read(member)
+    
+    def iter_documents(self):
+        """Yield (archive path, content as bytes) for each text document in reading order, one at a time"""
+        for member in self._documents:
+            yield member, self._zip.read(member)
+    
+    def _read_package(self):
+        """Locate the package file and read the title, manifest and spine"""
+        container = ElementTree.fromstring(self._zip.read("META-INF/container.xml"))
+        rootfile = container.find(f"{CONTAINER_NS}rootfiles/{CONTAINER_NS}rootfile")
+        if rootfile is None or not rootfile.get("full-path"):
+            raise ValueError("EPUB container does not name a package file")
+        opf_path = rootfile.get("full-path")
+        opf_dir = posixpath.dirname(opf_path)
+        package = ElementTree.fromstring(self._zip.read(opf_path))
+        
+        title = package.find(f"{OPF_NS}metadata/{DC_NS}title")
+        self.title = title.text.strip() if title is not None and title.text else None
+        
+        # Manifest id -> (archive path, media type, properties)
+        self.manifest = {}
+        for item in package.iterfind(f"{OPF_NS}manifest/{OPF_NS}item"):
+            href = item.get("href")
+            if not item.get("id") or not href:
+                continue
+            member = posixpath.normpath(posixpath.join(opf_dir, unquote(href.split("#")[0])))
+            self.manifest[item.get("id")] = (member, item.get("media-type", ""), item.get("properties", "").split())
+        
+        self._documents = []
+        for itemref in package.iterfind(f"{OPF_NS}spine/{OPF_NS}itemref"):
+            entry = self.manifest.get(itemref.get("idref"))
+            if entry is None:
+                continue
+            member, media_type, _ = entry
+            if media_type in DOCUMENT_MEDIA_TYPES:
+                self._documents.append(member)
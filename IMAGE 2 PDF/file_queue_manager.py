@@ -2,136 +2,300 @@
 File queue management functionality
 """
 
+import itertools
 import os
 from tkinter import messagebox
 
+# Listbox text colour of tasks handed back by the worker
+FINISHED_COLOURS = {
+    "done": "gray",
+    "skipped": "gray",
+    "failed": "red"
+}
+
+class FileQueue:
+    """
+    Files waiting for conversion, in queue order, each with a task ID that
+    stays with it until it is converted.
+    The order is a list of task IDs and the queued paths are also kept in a
+    dictionary, so duplicate checks are O(1) instead of a scan of the queue,
+    and moving a file is a swap of two list slots.
+    """
+    
+    def __init__(self):
+        """Initialize an empty queue"""
+        self._ids = []
+        # task ID -> (path, file type) of every queued file
+        self._files = {}
+        # path -> task ID
+        self._ids_by_path = {}
+    
+    def __len__(self):
+        """Number of queued files"""
+        return len(self._ids)
+    
+    def __iter__(self):
+        """Iterate over (path, file type) in queue order"""
+        return (self._files[task_id] for task_id in self._ids)
+    
+    def __contains__(self, file_path):
+        """Check whether a path is queued"""
+        return file_path in self._ids_by_path
+    
+    def items(self):
+        """Iterate over (task ID, path, file type) in queue order"""
+        return ((task_id, *self._files[task_id]) for task_id in self._ids)
+    
+    def add(self, task_id, file_path, file_type):
+        """Append a file under the given task ID unless it is already queued; return whether it was added"""
+        if file_path in self._ids_by_path:
+            return False
+        self._ids_by_path[file_path] = task_id
+        self._files[task_id] = (file_path, file_type)
+        self._ids.append(task_id)
+        return True
+    
+    def pop(self, index):
+        """Remove the file at a position and return its task ID"""
+        task_id = self._ids.pop(index)
+        del self._ids_by_path[self._files.pop(task_id)[0]]
+        return task_id
+    
+    def swap(self, index, other_index):
+        """Exchange the files at two positions"""
+        self._ids[index], self._ids[other_index] = self._ids[other_index], self._ids[index]
+    
+    def clear(self):
+        """Remove every file"""
+        self._ids = []
+        self._files = {}
+        self._ids_by_path = {}
+
+class QueueRows:
+    """
+    Task IDs of the queue rows, in row order, with the row of each task.
+    Both directions are dictionary or list lookups. Tasks are stored under a
+    slot number that only changes when rows before them are removed from the
+    middle; rows removed from the front just move the base slot, and finished
+    tasks keep their row until the batch ends, so completions never renumber rows.
+    """
+    
+    def __init__(self):
+        """Initialize with no rows"""
+        self._ids = []
+        # task ID -> slot; the row is the slot minus the slot of row 0
+        self._slots = {}
+        self._base = 0
+    
+    def __len__(self):
+        """Number of rows"""
+        return len(self._ids)
+    
+    def append(self, task_id):
+        """Add a row at the end for a task"""
+        self._slots[task_id] = self._base + len(self._ids)
+        self._ids.append(task_id)
+    
+    def task_at(self, row):
+        """Task ID shown in a row"""
+        return self._ids[row]
+    
+    def row_of(self, task_id):
+        """Row showing a task, or None if it has none"""
+        slot = self._slots.get(task_id)
+        return None if slot is None else slot - self._base
+    
+    def swap(self, row, other_row):
+        """Exchange the tasks of two rows"""
+        task_id, other_id = self._ids[row], self._ids[other_row]
+        self._ids[row], self._ids[other_row] = other_id, task_id
+        self._slots[task_id], self._slots[other_id] = self._base + other_row, self._base + row
+    
+    def pop(self, row):
+        """Remove a row and return its task ID"""
+        task_id = self._ids.pop(row)
+        del self._slots[task_id]
+        # The rows after it move up by one
+        for later_row in range(row, len(self._ids)):
+            self._slots[self._ids[later_row]] = self._base + later_row
+        return task_id
+    
+    def remove_first(self, count):
+        """Remove the first count rows and return their task IDs"""
+        removed = self._ids[:count]
+        del self._ids[:count]
+        for task_id in removed:
+            del self._slots[task_id]
+        self._base += len(removed)
+        return removed
+    
+    def clear(self):
+        """Remove every row"""
+        self._ids = []
+        self._slots = {}
+        self._base = 0
+
 class FileQueueManager:
     """
-    Handles the file queue for PDF conversion
+    Handles the file queue for PDF conversion.
+    The rows live here; the queue view (app.queue_list) asks for the labels
+    of the rows it shows. Every change to the queue is also recorded in the
+    journal, if there is one.
     """
     
-    def __init__(self, app):
-        """Initialize with reference to the main application"""
+    def __init__(self, app, journal=None):
+        """Initialize with reference to the main application and the queue journal"""
         self.app = app
+        self.journal = journal
+        # Source of task IDs; an ID is never reused
+        self._task_ids = itertools.count(1)
+        # task ID -> (path, file type) of every task with a row in the queue view
+        self.tasks = {}
+        # task ID -> "done", "skipped" or "failed" for tasks handed back by the worker
+        self.states = {}
+        self.rows = QueueRows()
+    
+    def row_count(self):
+        """Number of rows in the queue view"""
+        return len(self.rows)
+    
+    def row_label(self, row):
+        """Text and colour of a row of the queue view"""
+        task_id = self.rows.task_at(row)
+        return os.path.basename(self.tasks[task_id][0]), FINISHED_COLOURS.get(self.states.get(task_id))
     
     def add_to_queue(self, file_type, file_path):
         """Add a file to the queue"""
-        if file_path not in [item[0] for item in self.app.file_paths]:
-            self.app.file_paths.append((file_path, file_type))
-            self.app.queue_list.insert('end', os.path.basename(file_path))
-    
-    def update_queue_list(self, file_path):
-        """Update the queue list by removing a processed file"""
-        # Find the index of the file in the list
-        filename = os.path.basename(file_path)
-        for i in range(self.app.queue_list.size()):
-            if self.app.queue_list.get(i) == filename:
-                self.app.queue_list.delete(i)
-                # Update progress bar
-                if self.app.queue_list.size() > 0:  # Prevent division by zero
-                    progress = ((self.app.queue_list.size() - i) / self.app.queue_list.size()) * 100
-                    self.app.progress_var.set(progress)
-                else:
-                    self.app.progress_var.set(100)  # Set to 100% if queue is empty
-                break
+        self.add_files(file_type, [file_path])
+    
+    def add_files(self, file_type, file_paths):
+        """Add files of one type to the queue, skipping those already queued"""
+        added = []
+        for path in file_paths:
+            task_id = next(self._task_ids)
+            if self.app.file_paths.add(task_id, path, file_type):
+                self.tasks[task_id] = (path, file_type)
+                self.rows.append(task_id)
+                added.append((task_id, path, file_type))
+        if added:
+            self._record("added", added)
+            # Only the rows on screen are drawn, once for the whole batch
+            self.app.queue_list.refresh()
+    
+    def update_queue_list(self, task_id, state="done"):
+        """Mark a task handed back by the worker as done, skipped or failed; its row stays until the batch ends"""
+        row = self.rows.row_of(task_id)
+        if row is not None:
+            self.states[task_id] = state
+            self.app.queue_list.row_changed(row)
+    
+    def mark_finished(self, task_ids, state, outputs=None):
+        """Mark several tasks handed back by the worker, all in the same state, with their output paths (task ID -> path)"""
+        for task_id in task_ids:
+            self.update_queue_list(task_id, state)
+        self._record("finished", task_ids, state, outputs)
+    
+    def remove_finished(self):
+        """Remove the rows of the tasks handed to the worker, keeping the files queued since"""
+        count = len(self.rows) - len(self.app.file_paths)
+        if count > 0:
+            for task_id in self.rows.remove_first(count):
+                del self.tasks[task_id]
+                self.states.pop(task_id, None)
+            self.app.queue_list.rows_removed(0, count)
+        # Only the queued files are still worth resuming
+        self._record("compact", self.app.file_paths.items())
+    
+    def batch_started(self, output_dir):
+        """Record the output directory of a batch in the journal"""
+        self._record("batch_started", output_dir)
     
     def move_file_up(self):
         """Move the selected file up in the queue"""
-        selected = self.app.queue_list.curselection()
-        if not selected or selected[0] == 0:
-            return
-            
-        # Get current index and item
-        current_idx = selected[0]
-        item_text = self.app.queue_list.get(current_idx)
-        
-        # Get file path from the file list
-        file_path = None
-        for i, (path, _) in enumerate(self.app.file_paths):
-            if os.path.basename(path) == item_text:
-                file_path = self.app.file_paths.pop(i)
-                break
-                
-        if file_path:
-            # Insert at new position
-            self.app.file_paths.insert(current_idx - 1, file_path)
-            
-            # Update the listbox
-            self.app.queue_list.delete(current_idx)
-            self.app.queue_list.insert(current_idx - 1, item_text)
-            self.app.queue_list.selection_set(current_idx - 1)
+        self._move_selected(-1)
     
     def move_file_down(self):
         """Move the selected file down in the queue"""
-        selected = self.app.queue_list.curselection()
-        if not selected or selected[0] == self.app.queue_list.size() - 1:
-            return
-            
-        # Get current index and item
-        current_idx = selected[0]
-        item_text = self.app.queue_list.get(current_idx)
-        
-        # Get file path from the file list
-        file_path = None
-        for i, (path, _) in enumerate(self.app.file_paths):
-            if os.path.basename(path) == item_text:
-                file_path = self.app.file_paths.pop(i)
-                break
-                
-        if file_path:
-            # Insert at new position
-            self.app.file_paths.insert(current_idx + 1, file_path)
-            
-            # Update the listbox
-            self.app.queue_list.delete(current_idx)
-            self.app.queue_list.insert(current_idx + 1, item_text)
-            self.app.queue_list.selection_set(current_idx + 1)
+        self._move_selected(1)
     
     def remove_selected_file(self):
         """Remove the selected file from the queue"""
-        selected = self.app.queue_list.curselection()
-        if not selected:
+        current_idx = self.app.queue_list.selected_row()
+        if current_idx is None:
+            return
+        
+        # Only files that have not been handed to the worker can be removed
+        index = self._queue_index(current_idx)
+        if index is None:
             return
-            
-        # Get the item text
-        current_idx = selected[0]
-        item_text = self.app.queue_list.get(current_idx)
         
-        # Remove from file_paths
-        for i, (path, _) in enumerate(self.app.file_paths):
-            if os.path.basename(path) == item_text:
-                self.app.file_paths.pop(i)
-                break
-                
-        # Remove from listbox
-        self.app.queue_list.delete(current_idx)
+        # Remove from file_paths and the row map
+        task_id = self.app.file_paths.pop(index)
+        del self.tasks[self.rows.pop(current_idx)]
+        self._record("removed", [task_id])
+        
+        # Remove from the view
+        self.app.queue_list.rows_removed(current_idx)
     
     def clear_queue(self):
         """Clear all files from the queue"""
+        # Files being converted stay in the journal until they finish
+        self._record("removed", [task_id for task_id, _, _ in self.app.file_paths.items()])
+        
         # Clear the file list
-        self.app.file_paths = []
+        self.app.file_paths.clear()
         
-        # Clear the listbox
-        self.app.queue_list.delete(0, 'end')
+        # Clear the rows
+        self.tasks = {}
+        self.states = {}
+        self.rows.clear()
+        self.app.queue_list.reset()
     
     def show_file_details(self, event):
         """Show details for the selected file"""
-        selected = self.app.queue_list.curselection()
-        if not selected:
+        current_idx = self.app.queue_list.selected_row()
+        if current_idx is None:
             return
-            
-        # Get the item text
-        current_idx = selected[0]
-        item_text = self.app.queue_list.get(current_idx)
         
         # Find the file path
-        file_info = None
-        for path, file_type in self.app.file_paths:
-            if os.path.basename(path) == item_text:
-                file_info = (path, file_type)
-                break
-                
+        file_info = self.tasks.get(self.rows.task_at(current_idx))
+        
         if file_info:
             path, file_type = file_info
             details = f"File: {path}\nType: {file_type.upper()}\nSize: {os.path.getsize(path) / 1024:.2f} KB"
-            messagebox.showinfo("File Details", details)
\ No newline at end of file
+            messagebox.showinfo("File Details", details)
+    
+    def _move_selected(self, offset):
+        """Swap the selected file with the one offset rows away (-1 up, 1 down)"""
+        current_idx = self.app.queue_list.selected_row()
+        if current_idx is None:
+            return
+        
+        # Only queued files move, and only among themselves
+        index = self._queue_index(current_idx)
+        if index is None or not 0 <= index + offset < len(self.app.file_paths):
+            return
+        
+        self.app.file_paths.swap(index, index + offset)
+        self.rows.swap(current_idx, current_idx + offset)
+        self._record("swapped", self.rows.task_at(current_idx), self.rows.task_at(current_idx + offset))
+        self.app.queue_list.select(current_idx + offset)
+    
+    def _record(self, method, *args):
+        """Call a journal method; if the journal can't be written it is dropped and the queue carries on without it"""
+        if not self.journal:
+            return
+        try:
+            getattr(self.journal, method)(*args)
+        except OSError as e:
+            # Without a journal the queue just isn't kept across sessions
+            print(f"Could not write queue journal: {str(e)}")
+            self.journal = None
+    
+    def _queue_index(self, row):
+        """
+        Position in file_paths of the file shown in a row, or None for rows of
+        files already handed to the worker (those rows come before the queued files)
+        """
+        index = row - (len(self.rows) - len(self.app.file_paths))
+        return index if index >= 0 else None
\ No newline at end of file
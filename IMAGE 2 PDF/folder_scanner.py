@@ -0,0 +1,94 @@
+"""
+Background folder scanning that hands the files it finds to the queue in chunks
+"""
+
+import os
+import sys
+import threading
+import time
+
+def scan_folder(folder, extensions, stop_event=None):
+    """
+    Yield the paths of the files under folder whose extension (lowercase) is in
+    extensions, in the same order as os.walk. Entries come from os.scandir, whose
+    directory listing already says what is a file or folder, so most files need
+    no stat call. Unreadable folders are skipped; stops once stop_event is set.
+    """
+    pending = [folder]
+    while pending:
+        current = pending.pop()
+        subfolders = []
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if stop_event is not None and stop_event.is_set():
+                        return
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subfolders.append(entry.path)
+                        elif os.path.splitext(entry.name)[1].lower() in extensions and entry.is_file():
+                            yield entry.path
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+        # Visit the subfolders depth first, in listing order
+        pending.extend(reversed(subfolders))
+
+class FolderScanner:
+    """
+    Scans a folder on a background thread. The files found are passed to
+    on_chunk(paths, found so far) every chunk_size files or chunk_interval
+    seconds, whichever comes first, and on_done(found, cancelled) is called at
+    the end. Both callbacks run on the scanning thread.
+    """
+    
+    def __init__(self, folder, extensions, on_chunk, on_done, chunk_size=2000, chunk_interval=0.25):
+        """Initialize for a folder and the file extensions to pick up"""
+        self.folder = folder
+        self.extensions = extensions
+        self.on_chunk = on_chunk
+        self.on_done = on_done
+        self.chunk_size = chunk_size
+        self.chunk_interval = chunk_interval
+        self.found = 0
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Start scanning in the background"""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def cancel(self):
+        """Stop scanning; files already passed on stay in the queue"""
+        self._stop.set()
+    
+    @property
+    def cancelled(self):
+        """Whether the scan was cancelled"""
+        return self._stop.is_set()
+    
+    def _run(self):
+        """Scan the folder and pass the files on in chunks"""
+        chunk = []
+        last_chunk = time.monotonic()
+        try:
+            for path in scan_folder(self.folder, self.extensions, self._stop):
+                chunk.append(path)
+                if len(chunk) >= self.chunk_size or time.monotonic() - last_chunk >= self.chunk_interval:
+                    self._pass_on(chunk)
+                    chunk = []
+                    last_chunk = time.monotonic()
+            if chunk and not self.cancelled:
+                self._pass_on(chunk)
+        except Exception as e:
+            # Report what was found so far rather than losing the scan
+            print(f"Error scanning {self.folder}: {str(e)}", file=sys.stderr)
+        finally:
+            self.on_done(self.found, self.cancelled)
+    
+    def _pass_on(self, chunk):
+        """Hand a chunk of files to the callback"""
+        self.found += len(chunk)
+        self.on_chunk(chunk, self.found)
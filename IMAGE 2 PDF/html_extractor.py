@@ -0,0 +1,210 @@
+"""
+Streaming extraction of headings and paragraphs from (X)HTML documents
+"""
+
+import codecs
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+except ImportError:  # lxml is optional; the standard library parser is used instead
+    etree = None
+
+# Parser extract_blocks uses by default. The two don't always give the same blocks:
+# lxml closes an open paragraph or heading at the next one, as browsers do, so
+# <p>outer <p>inner</p> after</p> gives "outer " where the standard library
+# parser (like BeautifulSoup's html.parser) gives "outer inner after"
+DEFAULT_PARSER = "lxml" if etree is not None else "html.parser"
+
+# Elements whose text becomes a block in the PDF
+BLOCK_TAGS = ('p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+
+# Elements whose content is never shown as text
+SKIPPED_TAGS = ('script', 'style')
+
+# Image elements and the attributes holding their source, in order of preference
+IMAGE_ATTRIBUTES = {
+    'img': ('src',),
+    'image': ('xlink:href', 'href')
+}
+
+# Bytes fed to the parser at a time
+FEED_SIZE = 64 * 1024
+
+def extract_blocks(content, use_lxml=True):
+    """
+    Yield (tag, text) for every heading and paragraph of a document, in document order,
+    and ('img', source) for every image (an <img>, or an SVG <image> such as a cover).
+    The text of a block includes the text of everything inside it, like
+    BeautifulSoup's get_text(); images inside a block follow it. The document is
+    parsed incrementally and finished blocks are discarded, so no full tree is built.
+    content may be bytes (UTF-8) or str. Badly nested blocks depend on the
+    parser (see DEFAULT_PARSER).
+    """
+    if use_lxml and etree is not None:
+        extractor = LxmlBlockExtractor()
+    else:
+        extractor = StdlibBlockExtractor()
+    
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    for start in range(0, len(content), FEED_SIZE):
+        yield from extractor.feed(content[start:start + FEED_SIZE])
+    yield from extractor.close()
+
+def image_source(tag, attributes):
+    """Source of an image element, or None if it has none"""
+    for name in IMAGE_ATTRIBUTES[tag]:
+        if attributes.get(name):
+            return attributes[name]
+    return None
+
+class LxmlBlockExtractor:
+    """
+    Block extractor on lxml's event-based HTML parser.
+    Each outermost block is read once it ends and then cleared,
+    along with everything outside blocks that has already ended.
+    """
+    
+    def __init__(self):
+        """Create the pull parser"""
+        self._parser = etree.HTMLPullParser(events=('start', 'end'), encoding='utf-8')
+        # Number of currently open block elements
+        self._block_depth = 0
+    
+    def feed(self, data):
+        """Parse more of the document and return the blocks it completed"""
+        self._parser.feed(data)
+        return self._read_events()
+    
+    def close(self):
+        """Finish parsing and return the remaining blocks"""
+        self._parser.close()
+        return self._read_events()
+    
+    def _read_events(self):
+        """Turn parser events into (tag, text) blocks"""
+        blocks = []
+        for event, element in self._parser.read_events():
+            tag = element.tag
+            if not isinstance(tag, str):
+                continue
+            if event == 'start':
+                if tag in BLOCK_TAGS:
+                    self._block_depth += 1
+                continue
+            
+            if tag in BLOCK_TAGS:
+                self._block_depth -= 1
+                if self._block_depth:
+                    continue
+                # Outermost block finished: report it and any blocks nested in it, in document order
+                for block in element.iter(*BLOCK_TAGS, *IMAGE_ATTRIBUTES):
+                    if block.tag in IMAGE_ATTRIBUTES:
+                        source = image_source(block.tag, block.attrib)
+                        if source:
+                            blocks.append(('img', source))
+                    else:
+                        blocks.append((block.tag, self._text(block)))
+            elif self._block_depth:
+                continue
+            elif tag in IMAGE_ATTRIBUTES:
+                source = image_source(tag, element.attrib)
+                if source:
+                    blocks.append(('img', source))
+            
+            # Everything up to here has been reported; drop it
+            element.clear()
+            parent = element.getparent()
+            if parent is not None:
+                while element.getprevious() is not None:
+                    del parent[0]
+        return blocks
+    
+    def _text(self, element):
+        """All text inside an element, without scripts, styles and comments"""
+        parts = [element.text or ""]
+        for child in element:
+            if isinstance(child.tag, str) and child.tag not in SKIPPED_TAGS:
+                parts.append(self._text(child))
+            parts.append(child.tail or "")
+        return "".join(parts)
+
+class StdlibBlockExtractor(HTMLParser):
+    """
+    Block extractor on the standard library's HTMLParser, used when lxml is not installed.
+    Keeps only the text of the blocks that are currently open.
+    """
+    
+    def __init__(self):
+        """Initialize the parser state"""
+        super().__init__(convert_charrefs=True)
+        # [tag, text parts] for each open block, outermost first
+        self._open_blocks = []
+        # Finished blocks nested in a block that is still open, in document order
+        self._waiting = []
+        self._blocks = []
+        # Number of open script and style elements
+        self._skip_depth = 0
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    
+    def feed(self, data):
+        """Parse more of the document and return the blocks it completed"""
+        super().feed(self._decoder.decode(data))
+        return self._take_blocks()
+    
+    def close(self):
+        """Finish parsing and return the remaining blocks"""
+        super().close()
+        # Unclosed blocks end with the document
+        while self._open_blocks:
+            self._end_block()
+        return self._take_blocks()
+    
+    def handle_starttag(self, tag, attrs):
+        """Open a block, note an image, or start skipping a script or style"""
+        if tag in IMAGE_ATTRIBUTES:
+            source = image_source(tag, dict(attrs))
+            if source:
+                if self._open_blocks:
+                    # Inside a block, the image waits until the block is finished
+                    self._waiting.append(['img', [source]])
+                else:
+                    self._blocks.append(('img', source))
+        elif tag in BLOCK_TAGS:
+            block = [tag, []]
+            self._open_blocks.append(block)
+            # Keep the document order of nested blocks
+            self._waiting.append(block)
+        elif tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+    
+    def handle_endtag(self, tag):
+        """Close the matching block, and any blocks left open inside it"""
+        if tag in BLOCK_TAGS:
+            if any(block[0] == tag for block in self._open_blocks):
+                while self._end_block() != tag:
+                    pass
+        elif tag in SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+    
+    def handle_data(self, data):
+        """Add text to every open block"""
+        if self._skip_depth:
+            return
+        for block in self._open_blocks:
+            block[1].append(data)
+    
+    def _end_block(self):
+        """Close the innermost open block and return its tag"""
+        tag, _ = self._open_blocks.pop()
+        # Once the outermost block ends, it and its nested blocks are complete
+        if not self._open_blocks:
+            self._blocks.extend((block_tag, "".join(parts)) for block_tag, parts in self._waiting)
+            self._waiting = []
+        return tag
+    
+    def _take_blocks(self):
+        """Return and forget the completed blocks"""
+        blocks, self._blocks = self._blocks, []
+        return blocks
@@ -2,162 +2,346 @@
 Image to PDF conversion functionality
 """
 
-import os
+import io
+import sys
 from PIL import Image
-from reportlab.lib.pagesizes import letter, A4, legal
-from reportlab.lib.units import inch
-from reportlab.pdfgen import canvas
+
+from conversion_metrics import PROFILER
+from pdf_linearizer import linearize_file
+from pdf_writer import PDFImage, StreamingPDFWriter
+
+# Sum of the standard JPEG luminance quantization table (quality 50)
+STANDARD_LUMINANCE_TABLE_SUM = 3688
+
+# Formats whose frames each become a page (multi-page TIFF, animated GIF)
+MULTI_FRAME_FORMATS = ("TIFF", "GIF")
+
+# EXIF orientation tag and the transpose that shows each orientation upright
+ORIENTATION_TAG = 0x0112
+ORIENTATION_TRANSPOSES = {
+    2: Image.FLIP_LEFT_RIGHT,
+    3: Image.ROTATE_180,
+    4: Image.FLIP_TOP_BOTTOM,
+    5: Image.TRANSPOSE,
+    6: Image.ROTATE_270,
+    7: Image.TRANSVERSE,
+    8: Image.ROTATE_90
+}
+
+# Orientations that swap width and height
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+def render_image_pages(image_path, frame, options):
+    """
+    Decode, orient and resample one frame of an image (all frames if frame is None)
+    and return the finished pages as (image, x, y, width, height).
+    Runs in a worker process for parallel combined conversions.
+    """
+    converter = ImageConverter(options)
+    return list(converter._render_pages(image_path, options.get_page_size(), frame))
 
 class ImageConverter:
     """
     Handles conversion of image files to PDF
     """
     
-    def __init__(self, app):
-        """Initialize with reference to the main application"""
-        self.app = app
+    def __init__(self, options, status_callback=None):
+        """Initialize with the conversion options and an optional status callback"""
+        self.options = options
+        self.status_callback = status_callback
+        # (path, error message) for each file skipped by the last combined conversion
+        self.errors = []
+        # Pages written by the last conversion
+        self.page_count = 0
+        PROFILER.configure(options.timings_log)
     
-    def convert_to_pdf(self, image_path):
-        """Convert a single image to PDF"""
+    def convert_to_pdf(self, image_path, file_num=1):
+        """Convert a single image to PDF and return the output path"""
         try:
             # Generate output path
-            if self.app.custom_filename.get() and self.app.override_filename.get():
-                # Use custom filename pattern
-                base_name = os.path.splitext(os.path.basename(image_path))[0]
-                file_num = 0
-                
-                # Find the index if possible
-                for i, (path, file_type) in enumerate(self.app.file_paths):
-                    if path == image_path and file_type == "image":
-                        file_num = i
-                        break
-                
-                # Replace placeholders in pattern
-                output_filename = self.app.override_filename.get().replace('{name}', base_name).replace('{num}', str(file_num + 1))
-                if not output_filename.endswith('.pdf'):
-                    output_filename += '.pdf'
-            else:
-                # Use default filename
-                output_filename = os.path.splitext(os.path.basename(image_path))[0] + ".pdf"
-                
-            output_path = os.path.join(self.app.output_dir, output_filename)
+            output_path = self.options.output_path(image_path, file_num)
             
             # Get page size
-            page_size = self._get_page_size()
-            
-            # Open image and get dimensions
-            img = Image.open(image_path)
-            img_width, img_height = img.size
+            page_size = self.options.get_page_size()
             
             # Create PDF
-            c = canvas.Canvas(output_path, pagesize=page_size)
-            pdf_width, pdf_height = page_size
-            
-            # Calculate scaling to fit page while maintaining aspect ratio
-            width_ratio = pdf_width / img_width
-            height_ratio = pdf_height / img_height
-            ratio = min(width_ratio, height_ratio)
-            
-            # Calculate centered position
-            x_offset = (pdf_width - img_width * ratio) / 2
-            y_offset = (pdf_height - img_height * ratio) / 2
+            writer = StreamingPDFWriter(output_path, page_size, **self.options.writer_options())
+            try:
+                self._add_image_pages(writer, image_path, page_size)
+            except Exception:
+                writer.abort()
+                raise
             
-            # Draw image on PDF
-            c.drawImage(
-                image_path, 
-                x_offset, 
-                y_offset, 
-                width=img_width * ratio, 
-                height=img_height * ratio, 
-                preserveAspectRatio=True, 
-                anchor='c'
-            )
-            
-            c.save()
-            return True
+            self._close_writer(writer)
+            self.page_count = writer.page_count
+            return output_path
             
         except Exception as e:
             raise Exception(f"Error converting {image_path}: {str(e)}")
     
-    def convert_multiple_to_pdf(self, image_paths):
-        """Convert multiple images to a single PDF"""
+    def convert_multiple_to_pdf(self, image_paths, pool=None):
+        """
+        Convert multiple images to a single PDF and return the output path.
+        With a ConversionPool of more than one worker, images are decoded in
+        parallel and the pages are written in their original order.
+        """
+        self.errors = []
         try:
             # Generate output path
-            output_filename = f"{self.app.combined_filename.get()}.pdf"
-            if not output_filename.endswith('.pdf'):
-                output_filename += '.pdf'
-                
-            output_path = os.path.join(self.app.output_dir, output_filename)
+            output_path = self.options.combined_output_path()
             
             # Get page size
-            page_size = self._get_page_size()
+            page_size = self.options.get_page_size()
             
-            # Create PDF
-            c = canvas.Canvas(output_path, pagesize=page_size)
-            pdf_width, pdf_height = page_size
+            # Create PDF; every page is written to disk as soon as it is added
+            writer = StreamingPDFWriter(output_path, page_size, **self.options.writer_options(combined=True))
+            try:
+                if pool is not None and pool.max_workers > 1:
+                    self._write_pages_parallel(writer, image_paths, pool)
+                else:
+                    self._write_pages_serial(writer, image_paths, page_size)
+                
+                # Finish the PDF
+                self._close_writer(writer)
+            except Exception:
+                # Don't leave a truncated PDF behind
+                writer.abort()
+                raise
+            self.page_count = writer.page_count
+            return self._finish_combined(output_path)
             
-            # Process each image
-            for i, image_path in enumerate(image_paths):
+        except Exception as e:
+            raise Exception(f"Error creating combined PDF: {str(e)}")
+    
+    def _write_pages_serial(self, writer, image_paths, page_size):
+        """Decode and write the images one after another"""
+        for i, image_path in enumerate(image_paths):
+            try:
+                self._add_image_pages(writer, image_path, page_size,
+                                      status_prefix=f"Processing image {i+1} of {len(image_paths)}")
+                
+                # Update status
+                self._report_status(f"Processing image {i+1} of {len(image_paths)} "
+                                    f"({writer.bytes_written / (1024 * 1024):.1f} MB written)")
+                                    
+            except Exception as e:
+                # Log error but continue with next image
+                self._record_error(image_path, e)
+                continue
+    
+    def _write_pages_parallel(self, writer, image_paths, pool):
+        """
+        Decode, orient and resample images on the worker processes and write
+        the finished pages here, in order. The pool keeps only a few pages in
+        flight, so memory stays bounded however long the list is.
+        """
+        failed = set()
+        work = self._page_work(image_paths, failed)
+        for (i, image_path, frame, frame_count), pages, error in pool.map_ordered(render_image_pages, work):
+            if image_path in failed:
+                continue
+            if error is not None:
+                # Log error but continue with next image
+                failed.add(image_path)
+                self._record_error(image_path, error)
+                continue
+            
+            for page in pages:
+                self._write_page(writer, image_path, page)
+            
+            # Update status
+            status = f"Processing image {i+1} of {len(image_paths)}"
+            if frame_count > 1:
+                status += f" (frame {frame+1} of {frame_count})"
+            self._report_status(f"{status} ({writer.bytes_written / (1024 * 1024):.1f} MB written)")
+    
+    def _page_work(self, image_paths, failed):
+        """
+        Yield the work items for the worker processes as argument tuples for
+        render_image_pages, with the image number and frame count in front.
+        Each frame of a multi-page TIFF is its own item; other files, including
+        animated GIFs (whose frames can only be decoded in sequence), are one item.
+        """
+        for i, image_path in enumerate(image_paths):
+            frame_count = 1
+            if image_path.lower().endswith((".tif", ".tiff")):
                 try:
-                    # Open image and get dimensions
-                    img = Image.open(image_path)
-                    img_width, img_height = img.size
-                    
-                    # Calculate scaling to fit page while maintaining aspect ratio
-                    width_ratio = pdf_width / img_width
-                    height_ratio = pdf_height / img_height
-                    ratio = min(width_ratio, height_ratio)
-                    
-                    # Calculate centered position
-                    x_offset = (pdf_width - img_width * ratio) / 2
-                    y_offset = (pdf_height - img_height * ratio) / 2
-                    
-                    # Draw image on PDF
-                    c.drawImage(
-                        image_path, 
-                        x_offset, 
-                        y_offset, 
-                        width=img_width * ratio, 
-                        height=img_height * ratio, 
-                        preserveAspectRatio=True, 
-                        anchor='c'
-                    )
-                    
-                    # Update status
-                    self.app.root.after(0, lambda i=i, total=len(image_paths): 
-                                      self.app.status_var.set(f"Processing image {i+1} of {total}"))
-                    
-                    # Add a new page if not the last image
-                    if i < len(image_paths) - 1:
-                        c.showPage()
-                        
+                    with Image.open(image_path) as img:
+                        frame_count = getattr(img, "n_frames", 1)
                 except Exception as e:
-                    # Log error but continue with next image
-                    print(f"Error processing {image_path}: {str(e)}")
+                    failed.add(image_path)
+                    self._record_error(image_path, e)
                     continue
             
-            # Save the PDF
-            c.save()
-            
-            # Show success message
-            self.app.root.after(0, lambda: messagebox.showinfo("Success", 
-                                f"Combined PDF created successfully at:\n{output_path}"))
-            
-            return True
+            if frame_count > 1:
+                for frame in range(frame_count):
+                    yield (i, image_path, frame, frame_count), (image_path, frame, self.options)
+            else:
+                yield (i, image_path, 0, 1), (image_path, None, self.options)
+    
+    def _add_image_pages(self, writer, image_path, page_size, status_prefix=None):
+        """
+        Add a page for each frame of an image (one page for most formats).
+        Frames are decoded one at a time, so a long multi-page TIFF streams
+        into the PDF without being loaded as a whole.
+        """
+        for page in self._render_pages(image_path, page_size, status_prefix=status_prefix):
+            self._write_page(writer, image_path, page)
+    
+    def _write_page(self, writer, image_path, page):
+        """Write a rendered page to the PDF"""
+        with PROFILER.stage("write", file=image_path) as stage:
+            writer.add_image_page(*page)
+            stage.add(bytes_out=writer.bytes_written)
+    
+    def _close_writer(self, writer):
+        """Finish a PDF: resources, page tree and cross-reference table"""
+        with PROFILER.stage("close", pages=writer.page_count):
+            writer.close()
+    
+    def _render_pages(self, image_path, page_size, frame=None, status_prefix=None):
+        """
+        Yield (image, x, y, width, height) for each frame of an image,
+        or for the given frame only
+        """
+        # Open image (only the header is read here)
+        with Image.open(image_path) as img:
+            frames = [frame]
+            if frame is None:
+                frame_count = 1
+                if img.format in MULTI_FRAME_FORMATS:
+                    frame_count = getattr(img, "n_frames", 1)
+                frames = range(frame_count)
             
-        except Exception as e:
-            raise Exception(f"Error creating combined PDF: {str(e)}")
+            for index, frame_index in enumerate(frames):
+                if frame_index:
+                    img.seek(frame_index)
+                    if status_prefix:
+                        self._report_status(f"{status_prefix} (frame {index+1} of {len(frames)})")
+                with PROFILER.stage("prepare", file=image_path, frame=frame_index or 0):
+                    page = self._render_frame(image_path, img, page_size)
+                yield page
     
-    def _get_page_size(self):
-        """Get the selected page size"""
-        page_size_dict = {
-            "letter": letter,
-            "A4": A4,
-            "legal": legal,
-            "tabloid": (11*inch, 17*inch)  # Define tabloid size manually
-        }
-        return page_size_dict.get(self.app.page_size.get(), letter)
-
-
-# Import at the end to avoid circular imports
-from tkinter import messagebox
\ No newline at end of file
+    def _render_frame(self, image_path, img, page_size):
+        """Prepare the current frame and center it on the page, scaled to fit"""
+        pdf_width, pdf_height = page_size
+        
+        # Get dimensions, as the image is meant to be shown
+        orientation = img.getexif().get(ORIENTATION_TAG, 1)
+        img_width, img_height = img.size
+        if orientation in TRANSPOSED_ORIENTATIONS:
+            img_width, img_height = img_height, img_width
+        
+        # Calculate scaling to fit page while maintaining aspect ratio
+        width_ratio = pdf_width / img_width
+        height_ratio = pdf_height / img_height
+        ratio = min(width_ratio, height_ratio)
+        draw_width = img_width * ratio
+        draw_height = img_height * ratio
+        
+        # Calculate centered position
+        x_offset = (pdf_width - draw_width) / 2
+        y_offset = (pdf_height - draw_height) / 2
+        
+        # Downsample and re-encode before embedding
+        image = self._prepare_image(image_path, img, draw_width, draw_height, orientation)
+        return image, x_offset, y_offset, draw_width, draw_height
+    
+    def _prepare_image(self, image_path, img, draw_width, draw_height, orientation=1):
+        """
+        Downsample an image to the DPI cap for its size on the page, rotate it
+        as its EXIF orientation says and re-encode it as JPEG at the selected quality.
+        JPEGs that need none of this are passed through without being decoded.
+        Images with transparency are kept lossless so the alpha channel survives,
+        and black and white images (fax TIFFs) are kept lossless at one bit per pixel.
+        """
+        # Largest pixel size that stays within the DPI cap (drawing sizes are in points)
+        max_width = max(1, round(draw_width / 72 * self.options.max_dpi))
+        max_height = max(1, round(draw_height / 72 * self.options.max_dpi))
+        
+        if orientation not in ORIENTATION_TRANSPOSES and self._can_pass_through(img, max_width, max_height):
+            with open(image_path, "rb") as f:
+                return PDFImage.from_jpeg(f.read(), img.width, img.height, img.mode)
+        
+        # Resample before rotating, so the target size is in stored (unrotated) pixels
+        if orientation in TRANSPOSED_ORIENTATIONS:
+            max_width, max_height = max_height, max_width
+        
+        if img.mode == "1":
+            return self._prepare_bilevel(image_path, img, max_width, max_height, orientation)
+        
+        # Let the JPEG decoder scale down while decoding
+        if img.format == "JPEG":
+            img.draft(img.mode, (max_width, max_height))
+        
+        if img.width > max_width or img.height > max_height:
+            img = img.resize((max_width, max_height), Image.LANCZOS)
+        
+        if orientation in ORIENTATION_TRANSPOSES:
+            img = img.transpose(ORIENTATION_TRANSPOSES[orientation])
+        
+        if img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info:
+            return PDFImage.from_pil(img)
+        
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        
+        # Decoding is lazy, so this also includes any part of the decode not yet done
+        with PROFILER.stage("encode", file=image_path, width=img.width, height=img.height):
+            buffer = io.BytesIO()
+            img.save(buffer, "JPEG", quality=self.options.quality, optimize=True)
+        return PDFImage.from_jpeg(buffer.getvalue(), img.width, img.height, img.mode)
+    
+    def _prepare_bilevel(self, image_path, img, max_width, max_height, orientation):
+        """
+        Keep a black and white image black and white: resample it only if it is
+        over the DPI cap (in grayscale, then thresholded) and store it losslessly
+        at one bit per pixel, rather than as a blurry grayscale JPEG
+        """
+        if img.width > max_width or img.height > max_height:
+            img = img.convert("L").resize((max_width, max_height), Image.LANCZOS)
+            img = img.point(lambda value: 255 if value >= 128 else 0, "1")
+        
+        if orientation in ORIENTATION_TRANSPOSES:
+            img = img.transpose(ORIENTATION_TRANSPOSES[orientation])
+        
+        # Decoding is lazy, so this also includes any part of the decode not yet done
+        with PROFILER.stage("encode", file=image_path, width=img.width, height=img.height):
+            return PDFImage.from_bilevel(img)
+    
+    def _can_pass_through(self, img, max_width, max_height):
+        """Check whether a JPEG can be embedded without decoding it"""
+        if img.format != "JPEG" or img.mode not in ("RGB", "L"):
+            return False
+        if img.width > max_width or img.height > max_height:
+            return False
+        # Re-encoding only pays off if the file is stored at a higher quality than selected
+        return self._estimate_jpeg_quality(img) <= self.options.quality + 1
+    
+    def _estimate_jpeg_quality(self, img):
+        """Estimate the libjpeg quality setting from the luminance quantization table"""
+        tables = getattr(img, "quantization", None)
+        if not tables or 0 not in tables:
+            return 100
+        # Invert libjpeg's table scaling: 5000/quality below 50, 200 - 2*quality above
+        scale = sum(tables[0]) * 100 / STANDARD_LUMINANCE_TABLE_SUM
+        if scale <= 100:
+            return (200 - scale) / 2
+        return 5000 / scale
+    
+    def _finish_combined(self, output_path):
+        """Linearize a finished combined PDF if the options ask for it, and return its path"""
+        if self.options.linearize:
+            with PROFILER.stage("linearize", file=output_path):
+                linearize_file(output_path)
+        return output_path
+    
+    def _record_error(self, image_path, error):
+        """Log an image that could not be added to a combined PDF"""
+        print(f"Error processing {image_path}: {str(error)}", file=sys.stderr)
+        self.errors.append((image_path, str(error)))
+    
+    def _report_status(self, message):
+        """Pass a status message to the callback, if any"""
+        if self.status_callback:
+            self.status_callback(message)
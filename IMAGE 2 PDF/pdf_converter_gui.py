@@ -12,7 +12,20 @@ import time
 
 from image_converter import ImageConverter
 from epub_converter import EPUBConverter
-from file_queue_manager import FileQueueManager
+from file_queue_manager import FileQueue, FileQueueManager
+from queue_view import VirtualQueueView
+from conversion_options import ConversionOptions, PDF_PROFILES
+from conversion_pool import ConversionPool, default_worker_count
+from conversion_cache import ConversionCache
+from conversion_metrics import PROFILER, ThroughputCounter
+from folder_scanner import FolderScanner
+from progress_aggregator import ProgressAggregator
+from queue_journal import QueueJournal
+from batch_converter import IMAGE_EXTENSIONS, EPUB_EXTENSIONS
+
+# Markers put on the task queue alongside the conversion tasks
+BATCH_DONE = ("batch_done", None, None, None, None)
+STOP_WORKER = ("stop_worker", None, None, None, None)
 
 class PDFConverterApp:
     """Main application class for the PDF Converter"""
@@ -27,12 +40,13 @@ class PDFConverterApp:
         # Initialize variables
         self.init_variables()
         
-        # Create converters
-        self.image_converter = ImageConverter(self)
-        self.epub_converter = EPUBConverter(self)
+        # Create worker pool for individual file conversions
+        self.conversion_pool = ConversionPool(self.worker_count.get())
+        self.conversion_cache = None
         
-        # Create queue manager
-        self.queue_manager = FileQueueManager(self)
+        # Create queue manager, recording the queue in the journal
+        self.queue_journal = QueueJournal()
+        self.queue_manager = FileQueueManager(self, self.queue_journal)
         
         # Create main frame
         self.main_frame = ttk.Frame(root, padding="10")
@@ -57,13 +71,16 @@ class PDFConverterApp:
         self.setup_options_frame()
         self.setup_queue_display()
         
+        # Offer to pick up the files a previous session left unconverted
+        self.resume_unfinished()
+        
         # Start worker thread for processing
         self.worker_thread = threading.Thread(target=self.process_queue, daemon=True)
         self.worker_thread.start()
     
     def init_variables(self):
         """Initialize all variables used by the application"""
-        self.file_paths = []
+        self.file_paths = FileQueue()
         self.output_dir = os.path.expanduser("~/Documents")
         self.task_queue = queue.Queue()
         self.processing = False
@@ -73,6 +90,21 @@ class PDFConverterApp:
         self.combined_filename = tk.StringVar(value="combined_document")
         self.custom_filename = tk.BooleanVar(value=False)
         self.override_filename = tk.StringVar(value="")
+        self.worker_count = tk.IntVar(value=default_worker_count())
+        self.skip_unchanged = tk.BooleanVar(value=True)
+        self.linearize = tk.BooleanVar(value=False)
+        self.pdf_profile = tk.StringVar(value="standard")
+        self.log_timings = tk.BooleanVar(value=False)
+        # Files, pages and bytes done in the current batch
+        self.throughput = ThroughputCounter()
+        # Progress from the worker thread, applied to the UI at most ten times a second
+        self.progress_updates = ProgressAggregator(self.root, self.apply_progress)
+        # Folder scans still running
+        self.folder_scans = []
+        # Options of a batch that takes in the files the running scans find, or None
+        self.streaming_options = None
+        # Number of the last file queued in the current batch
+        self.batch_file_count = 0
         self.worker_running = True  # Flag to control worker thread
     
     def setup_image_tab(self):
@@ -126,6 +158,11 @@ class PDFConverterApp:
         size_menu = ttk.OptionMenu(size_frame, self.page_size, *size_options)
         size_menu.pack(side=tk.LEFT, padx=5)
         
+        # Output profile (compact: compressed content and object streams)
+        ttk.Label(size_frame, text="PDF Output:").pack(side=tk.LEFT, padx=5)
+        profile_menu = ttk.OptionMenu(size_frame, self.pdf_profile, self.pdf_profile.get(), *PDF_PROFILES)
+        profile_menu.pack(side=tk.LEFT, padx=5)
+        
         # Quality slider for images
         quality_frame = ttk.Frame(options_frame)
         quality_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -137,6 +174,23 @@ class PDFConverterApp:
         quality_label = ttk.Label(quality_frame, textvariable=self.quality)
         quality_label.pack(side=tk.LEFT, padx=5)
         
+        # Number of worker processes
+        workers_frame = ttk.Frame(options_frame)
+        workers_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        ttk.Label(workers_frame, text="Worker Processes:").pack(side=tk.LEFT, padx=5)
+        workers_spinbox = ttk.Spinbox(workers_frame, from_=1, to=default_worker_count() * 2,
+                                      textvariable=self.worker_count, width=5)
+        workers_spinbox.pack(side=tk.LEFT, padx=5)
+        
+        skip_check = ttk.Checkbutton(workers_frame, text="Skip files already converted with the same settings",
+                                     variable=self.skip_unchanged)
+        skip_check.pack(side=tk.LEFT, padx=5)
+        
+        # Stage timings go to a JSON lines file in the output directory, from the next conversion on
+        timings_check = ttk.Checkbutton(workers_frame, text="Log stage timings", variable=self.log_timings)
+        timings_check.pack(side=tk.LEFT, padx=5)
+        
         # Output directory
         output_frame = ttk.Frame(options_frame)
         output_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -167,6 +221,10 @@ class PDFConverterApp:
         combined_entry.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
         ttk.Label(self.combined_filename_frame, text=".pdf").pack(side=tk.LEFT)
         
+        linearize_check = ttk.Checkbutton(self.combined_filename_frame, text="Fast web view (linearize)",
+                                          variable=self.linearize)
+        linearize_check.pack(side=tk.LEFT, padx=10)
+        
         # Initially hide the combined filename frame
         self.combined_filename_frame.pack_forget()
         
@@ -222,17 +280,16 @@ class PDFConverterApp:
         clear_btn = ttk.Button(queue_controls_frame, text="Clear All", command=self.queue_manager.clear_queue)
         clear_btn.pack(side=tk.LEFT, padx=5)
         
-        # Scrollable list of files
+        # Only enabled while a folder is being scanned
+        self.stop_scan_btn = ttk.Button(queue_controls_frame, text="Stop Scan", command=self.stop_folder_scans,
+                                        state=tk.DISABLED)
+        self.stop_scan_btn.pack(side=tk.LEFT, padx=5)
+        
+        # Scrollable list of files; only the rows on screen are put in the listbox
         list_frame = ttk.Frame(queue_frame)
         list_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
-        scrollbar = ttk.Scrollbar(list_frame)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        self.queue_list = tk.Listbox(list_frame, height=10, selectmode=tk.SINGLE)
-        self.queue_list.pack(fill=tk.BOTH, expand=True)
-        self.queue_list.config(yscrollcommand=scrollbar.set)
-        scrollbar.config(command=self.queue_list.yview)
+        self.queue_list = VirtualQueueView(list_frame, self.queue_manager, height=10)
         
         # Bind double-click to view file details
         self.queue_list.bind('<Double-1>', self.queue_manager.show_file_details)
@@ -247,30 +304,54 @@ class PDFConverterApp:
         status_label = ttk.Label(queue_frame, textvariable=self.status_var)
         status_label.pack(padx=5, pady=5)
     
+    def resume_unfinished(self):
+        """Start the queue journal, first offering to queue the files the last session didn't finish"""
+        unfinished, output_dir = self.queue_journal.load()
+        resume = bool(unfinished) and messagebox.askyesno(
+            "Resume",
+            f"{len(unfinished)} files from the last session were not converted.\n"
+            "Add them back to the queue?"
+        )
+        try:
+            self.queue_journal.start(output_dir if resume else None)
+        except OSError as e:
+            # Without a journal the queue just isn't kept across sessions
+            print(f"Could not write queue journal: {str(e)}")
+            self.queue_manager.journal = None
+        
+        if not resume:
+            return
+        if output_dir:
+            self.output_dir = output_dir
+            self.output_path_var.set(output_dir)
+        # Queue runs of files of the same type together, keeping their order
+        run_type, run = None, []
+        for path, file_type in unfinished:
+            if file_type != run_type and run:
+                self.queue_manager.add_files(run_type, run)
+                run = []
+            run_type = file_type
+            run.append(path)
+        self.queue_manager.add_files(run_type, run)
+        self.status_var.set(f"Resumed {len(unfinished)} unfinished files")
+    
     def select_images(self):
         """Open file dialog to select image files"""
         files = filedialog.askopenfilenames(
             title="Select image files",
             filetypes=(
-                ("Image files", "*.jpg *.jpeg *.png *.bmp *.gif *.tiff"),
+                ("Image files", "*.jpg *.jpeg *.png *.bmp *.gif *.tif *.tiff"),
                 ("All files", "*.*")
             )
         )
         if files:
-            for file in files:
-                self.queue_manager.add_to_queue("image", file)
+            self.queue_manager.add_files("image", files)
     
     def select_image_folder(self):
         """Open folder dialog to select all images in a folder"""
         folder = filedialog.askdirectory(title="Select folder with images")
         if folder:
-            image_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff']
-            for root, _, files in os.walk(folder):
-                for file in files:
-                    ext = os.path.splitext(file)[1].lower()
-                    if ext in image_extensions:
-                        full_path = os.path.join(root, file)
-                        self.queue_manager.add_to_queue("image", full_path)
+            self.start_folder_scan(folder, "image", IMAGE_EXTENSIONS)
     
     def select_epubs(self):
         """Open file dialog to select EPUB files"""
@@ -282,18 +363,56 @@ class PDFConverterApp:
             )
         )
         if files:
-            for file in files:
-                self.queue_manager.add_to_queue("epub", file)
+            self.queue_manager.add_files("epub", files)
     
     def select_epub_folder(self):
         """Open folder dialog to select all EPUBs in a folder"""
         folder = filedialog.askdirectory(title="Select folder with EPUB files")
         if folder:
-            for root, _, files in os.walk(folder):
-                for file in files:
-                    if file.lower().endswith('.epub'):
-                        full_path = os.path.join(root, file)
-                        self.queue_manager.add_to_queue("epub", full_path)
+            self.start_folder_scan(folder, "epub", EPUB_EXTENSIONS)
+    
+    def start_folder_scan(self, folder, file_type, extensions):
+        """Scan a folder in the background, adding the files it finds to the queue as they turn up"""
+        scanner = FolderScanner(
+            folder, extensions,
+            on_chunk=lambda paths, found: self.root.after(0, self.add_scanned_files, file_type, paths, found),
+            on_done=lambda found, cancelled: self.root.after(0, self.finish_folder_scan, scanner, found, cancelled)
+        )
+        self.folder_scans.append(scanner)
+        self.stop_scan_btn.config(state=tk.NORMAL)
+        self.status_var.set(f"Scanning {folder}...")
+        scanner.start()
+    
+    def add_scanned_files(self, file_type, paths, found):
+        """Add a chunk of files found by a folder scan (Tk thread)"""
+        self.queue_manager.add_files(file_type, paths)
+        if self.streaming_options is not None:
+            # A batch started during the scan converts the files as they are found
+            self.throughput.add_total(len(self.file_paths))
+            self.queue_file_tasks(self.streaming_options)
+        else:
+            self.status_var.set(f"Scanning... {found} files found")
+    
+    def finish_folder_scan(self, scanner, found, cancelled):
+        """Report a finished folder scan, and end a batch that was waiting for the scans (Tk thread)"""
+        if scanner in self.folder_scans:
+            self.folder_scans.remove(scanner)
+        if not self.folder_scans:
+            self.stop_scan_btn.config(state=tk.DISABLED)
+        if self.streaming_options is None:
+            if cancelled:
+                self.status_var.set(f"Scan stopped, {found} files found in {scanner.folder}")
+            else:
+                self.status_var.set(f"{found} files found in {scanner.folder}")
+        elif not self.folder_scans:
+            # Every file found is queued, so the worker can finish the batch
+            self.streaming_options = None
+            self.task_queue.put(BATCH_DONE)
+    
+    def stop_folder_scans(self):
+        """Stop the running folder scans; the files already found stay in the queue"""
+        for scanner in self.folder_scans:
+            scanner.cancel()
     
     def select_output_dir(self):
         """Open folder dialog to select output directory"""
@@ -344,112 +463,276 @@ class PDFConverterApp:
                     messagebox.showerror("Error", f"Could not create output directory: {str(e)}")
                     return
                     
-            # Sort files by type for better handling
-            image_files = []
-            epub_files = []
+            # Snapshot the settings so worker processes don't touch Tk variables
+            options = ConversionOptions.from_app(self)
+            self.queue_manager.batch_started(self.output_dir)
             
-            for file_path, file_type in self.file_paths:
+            # Manifest of earlier conversions in the output directory
+            self.conversion_cache = ConversionCache(self.output_dir) if self.skip_unchanged.get() else None
+            try:
+                self.conversion_pool.set_max_workers(self.worker_count.get())
+            except (tk.TclError, ValueError):
+                self.worker_count.set(self.conversion_pool.max_workers)
+            
+            # Sort files by type for better handling, keeping their task IDs
+            image_files, image_ids = [], []
+            epub_files, epub_ids = [], []
+            
+            for task_id, file_path, file_type in self.file_paths.items():
                 if file_type == "image":
                     image_files.append(file_path)
+                    image_ids.append(task_id)
                 elif file_type == "epub":
                     epub_files.append(file_path)
+                    epub_ids.append(task_id)
+            
+            self.throughput.start(len(self.file_paths))
             
-            # Check if we need to combine files
+            # Each task is (type, target, file number, options, task ID or IDs)
             if self.combine_files.get():
-                # Create separate combined tasks for images and epubs
-                if image_files:
-                    self.task_queue.put(("combined_images", image_files))
-                if epub_files:
-                    self.task_queue.put(("combined_epub", epub_files))
+                # Create separate combined tasks for images and epubs, in separate files if both exist
+                if image_files and epub_files:
+                    self.task_queue.put(("combined_images", image_files, None,
+                                         options.for_combined_part("images"), image_ids))
+                    self.task_queue.put(("combined_epub", epub_files, None,
+                                         options.for_combined_part("epub"), epub_ids))
+                elif image_files:
+                    self.task_queue.put(("combined_images", image_files, None, options, image_ids))
+                elif epub_files:
+                    self.task_queue.put(("combined_epub", epub_files, None, options, epub_ids))
+            elif len(self.file_paths) == 1 and epub_files and not self.folder_scans:
+                # A lone EPUB gets the whole worker pool, with its chapters spread over the workers
+                self.task_queue.put(("epub_chapters", epub_files[0], 1, options, epub_ids[0]))
             else:
-                # Add individual file tasks
-                for file_path, file_type in self.file_paths:
-                    self.task_queue.put((file_type, file_path))
+                # Add individual file tasks, numbered by their position in the queue
+                self.batch_file_count = 0
+                self.queue_file_tasks(options)
+            
+            if self.folder_scans and not self.combine_files.get():
+                # The files the running scans find join this batch, which ends once the scans are done
+                self.streaming_options = options
+            else:
+                # Tell the worker when this batch ends
+                self.task_queue.put(BATCH_DONE)
             
             # Clear the file paths list but keep the display
-            self.file_paths = []
+            self.file_paths.clear()
             
             # Update status
             self.status_var.set("Processing queue...")
             self.processing = True
     
+    def queue_file_tasks(self, options):
+        """Hand the queued files to the worker as individual tasks, numbered on from the batch's last file"""
+        for task_id, file_path, file_type in self.file_paths.items():
+            self.batch_file_count += 1
+            self.task_queue.put((file_type, file_path, self.batch_file_count, options, task_id))
+        self.file_paths.clear()
+    
     def process_queue(self):
         """Worker thread function to process the task queue"""
-        while self.worker_running:
+        while True:
             try:
-                if not self.task_queue.empty() and self.processing:
-                    task = self.task_queue.get()
-                    file_type = task[0]
+                if not self.worker_running:
+                    # Closing; the pool is only used on this thread, so it is stopped here
+                    self.conversion_pool.shutdown()
+                    break
+                
+                # Hand back the oldest result while the pool is full or nothing else is queued
+                if self.conversion_pool.has_pending() and (self.conversion_pool.is_full() or self.task_queue.empty()):
+                    self.deliver_next_result()
+                    continue
+                
+                # Block until the next task arrives
+                task = self.task_queue.get()
+                
+                if task is STOP_WORKER or not self.worker_running:
+                    # Shutting down; drop the remaining tasks and stop the pool
+                    self.task_queue.task_done()
+                    self.conversion_pool.shutdown()
+                    break
+                
+                file_type, target, file_num, options, task_ids = task
+                if options is not None:
+                    # Profiling follows the settings the task was queued with
+                    PROFILER.configure(options.timings_log)
+                
+                try:
+                    if task is BATCH_DONE:
+                        # Report the files still in flight, then reset processing flag
+                        self.finish_pending_conversions()
+                        if self.conversion_cache:
+                            self.conversion_cache.save()
+                        PROFILER.event("batch", **self.throughput.snapshot())
+                        self.root.after(0, self.reset_processing)
                     
-                    try:
-                        if file_type == "image":
-                            file_path = task[1]
-                            # Update status
-                            self.root.after(0, lambda p=file_path: self.status_var.set(f"Converting: {os.path.basename(p)}"))
-                            self.image_converter.convert_to_pdf(file_path)
-                            # Remove from list
-                            self.root.after(0, lambda fp=file_path: self.queue_manager.update_queue_list(fp))
-                            
-                        elif file_type == "epub":
-                            file_path = task[1]
-                            # Update status
-                            self.root.after(0, lambda p=file_path: self.status_var.set(f"Converting: {os.path.basename(p)}"))
-                            self.epub_converter.convert_to_pdf(file_path)
-                            # Remove from list
-                            self.root.after(0, lambda fp=file_path: self.queue_manager.update_queue_list(fp))
-                            
-                        elif file_type == "combined_images":
-                            image_files = task[1]
-                            # Update status
-                            self.root.after(0, lambda n=len(image_files): self.status_var.set(f"Creating combined PDF from {n} images"))
-                            self.image_converter.convert_multiple_to_pdf(image_files)
-                            # Remove all files from list
-                            for file_path in image_files:
-                                self.root.after(0, lambda fp=file_path: self.queue_manager.update_queue_list(fp))
-                                
-                        elif file_type == "combined_epub":
-                            epub_files = task[1]
-                            # Update status
-                            self.root.after(0, lambda n=len(epub_files): self.status_var.set(f"Creating combined PDF from {n} EPUB files"))
-                            self.epub_converter.convert_multiple_to_pdf(epub_files)
-                            # Remove all files from list
-                            for file_path in epub_files:
-                                self.root.after(0, lambda fp=file_path: self.queue_manager.update_queue_list(fp))
+                    elif file_type in ("image", "epub"):
+                        output_path = options.output_path(target, file_num)
+                        self.wait_for_output(output_path)
+                        if self.conversion_cache and self.conversion_cache.is_current(target, output_path, options):
+                            # Unchanged since the last run; keep its place in the result order
+                            self.conversion_pool.add_skipped(file_type, target, output_path, options, task_ids)
+                        else:
+                            # Hand the file to the worker pool
+                            self.conversion_pool.submit(file_type, target, file_num, options, task_ids)
                         
-                    except Exception as e:
-                        error_msg = str(e)
-                        self.root.after(0, lambda m=error_msg: messagebox.showerror("Conversion Error", m))
-                    
-                    # Mark task as done
-                    self.task_queue.task_done()
+                    elif file_type == "epub_chapters":
+                        with PROFILER.stage("task", task=file_type, file=target):
+                            self.run_chapter_parallel_task(target, file_num, options, task_ids)
+                        
+                    elif file_type == "combined_images":
+                        with PROFILER.stage("task", task=file_type, files=len(target)):
+                            self.run_combined_task(ImageConverter, target, task_ids, options,
+                                                   f"Creating combined PDF from {len(target)} images")
+                            
+                    elif file_type == "combined_epub":
+                        with PROFILER.stage("task", task=file_type, files=len(target)):
+                            self.run_combined_task(EPUBConverter, target, task_ids, options,
+                                                   f"Creating combined PDF from {len(target)} EPUB files")
                     
-                    # If queue is empty, reset processing flag
-                    if self.task_queue.empty():
-                        self.root.after(0, self.reset_processing)
+                except Exception as e:
+                    if task is not BATCH_DONE:
+                        # The task's files are done, if not converted
+                        failed_ids = task_ids if file_type.startswith("combined") else [task_ids]
+                        self.throughput.add(len(failed_ids))
+                        self.mark_tasks(failed_ids, "failed")
+                    error_msg = str(e)
+                    self.root.after(0, lambda m=error_msg: messagebox.showerror("Conversion Error", m))
                 
-                # Sleep to prevent CPU hogging
-                time.sleep(0.05)
+                # Mark task as done
+                self.task_queue.task_done()
             
             except Exception as e:
                 # Log any unexpected errors but don't crash the thread
                 print(f"Unexpected error in process_queue: {str(e)}")
                 time.sleep(1)  # Slow down if we hit unexpected errors
     
+    def deliver_next_result(self):
+        """Wait for the oldest file in the worker pool and report it on the Tk thread"""
+        result = self.conversion_pool.next_result()
+        file_path = result.file_path
+        if result.error is not None:
+            # Report the failure for this file only
+            error_msg = str(result.error)
+            self.root.after(0, lambda m=error_msg: messagebox.showerror("Conversion Error", m))
+            self.throughput.add()
+            self.report_progress(f"Failed: {os.path.basename(file_path)}")
+            self.mark_tasks([result.task_id], "failed")
+        elif result.skipped:
+            self.throughput.add()
+            self.report_progress(f"Unchanged, skipped: {os.path.basename(file_path)}")
+            self.mark_tasks([result.task_id], "skipped", result.output_path)
+        else:
+            if self.conversion_cache:
+                self.conversion_cache.record(file_path, result.output_path, result.options)
+            self.throughput.add_output(result.output_path, pages=result.pages)
+            self.report_progress(f"Converted: {os.path.basename(file_path)}")
+            self.mark_tasks([result.task_id], "done", result.output_path)
+    
+    def finish_pending_conversions(self):
+        """Report every file still in the worker pool"""
+        while self.conversion_pool.has_pending():
+            self.deliver_next_result()
+    
+    def wait_for_output(self, output_path):
+        """Report files from the worker pool until none still being converted writes to output_path"""
+        # Two inputs with the same name convert to the same file; the later one waits so the writes don't mix
+        while self.conversion_pool.is_writing(output_path):
+            self.deliver_next_result()
+    
+    def run_combined_task(self, converter_class, file_paths, task_ids, options, status):
+        """Build a combined PDF on the worker thread unless an identical one already exists"""
+        # Finish individual files first so results stay in queue order
+        self.finish_pending_conversions()
+        
+        output_path = options.combined_output_path()
+        if self.conversion_cache and self.conversion_cache.is_combined_current(file_paths, output_path, options):
+            self.throughput.add(len(file_paths))
+            self.report_progress(f"Unchanged, skipped: {os.path.basename(output_path)}")
+            self.mark_tasks(task_ids, "skipped", output_path)
+            return
+        
+        # Update status
+        self.set_status_from_worker(status)
+        converter = converter_class(options, self.set_status_from_worker)
+        # Pages are rendered on the worker processes and assembled in order here
+        output_path = converter.convert_multiple_to_pdf(file_paths, pool=self.conversion_pool)
+        
+        # Only a complete document counts as up to date next time
+        if self.conversion_cache and not converter.errors:
+            self.conversion_cache.record_combined(file_paths, output_path, options)
+        self.throughput.add_output(output_path, files=len(file_paths), pages=converter.page_count)
+        self.report_progress(f"Created: {os.path.basename(output_path)}")
+        # Files left out of the document are marked as failed
+        failed = set(path for path, _ in converter.errors)
+        self.mark_tasks([task_id for task_id, path in zip(task_ids, file_paths) if path not in failed], "done", output_path)
+        self.mark_tasks([task_id for task_id, path in zip(task_ids, file_paths) if path in failed], "failed")
+        self.report_combined_result(output_path)
+    
+    def run_chapter_parallel_task(self, file_path, file_num, options, task_id):
+        """Convert a single EPUB on the worker thread, laying out and drawing its chapters on the worker pool"""
+        output_path = options.output_path(file_path, file_num)
+        self.wait_for_output(output_path)
+        if self.conversion_cache and self.conversion_cache.is_current(file_path, output_path, options):
+            self.throughput.add()
+            self.report_progress(f"Unchanged, skipped: {os.path.basename(file_path)}")
+            self.mark_tasks([task_id], "skipped", output_path)
+        else:
+            self.set_status_from_worker(f"Converting {os.path.basename(file_path)}")
+            converter = EPUBConverter(options, self.set_status_from_worker)
+            converter.convert_to_pdf(file_path, file_num, pool=self.conversion_pool)
+            if self.conversion_cache:
+                self.conversion_cache.record(file_path, output_path, options)
+            self.throughput.add_output(output_path, pages=converter.page_count)
+            self.report_progress(f"Converted: {os.path.basename(file_path)}")
+            self.mark_tasks([task_id], "done", output_path)
+    
+    def mark_tasks(self, task_ids, state, output_path=None):
+        """Mark the rows of finished tasks as done, skipped or failed, and the file they went to (worker thread)"""
+        self.progress_updates.finished(task_ids, state, output_path)
+    
+    def report_combined_result(self, output_path):
+        """Show where the combined PDF was written"""
+        # Show success message
+        self.root.after(0, lambda: messagebox.showinfo("Success", 
+                            f"Combined PDF created successfully at:\n{output_path}"))
+    
+    def report_progress(self, message):
+        """Show a status message with the batch's throughput and ETA, and advance the progress bar (worker thread)"""
+        self.progress_updates.status(message, with_throughput=True)
+        PROFILER.event("progress", message=message, **self.throughput.snapshot())
+    
+    def apply_progress(self, finished, outputs, status):
+        """Mark the rows of the tasks finished since the last update and show the latest status (Tk thread)"""
+        for state, task_ids in finished.items():
+            self.queue_manager.mark_finished(task_ids, state, outputs)
+        if status is not None:
+            message, with_throughput = status
+            if with_throughput:
+                # Throughput as of now, not as of the message
+                message = f"{message} | {self.throughput.summary()}"
+            self.status_var.set(message)
+        if self.processing:
+            self.progress_var.set(self.throughput.fraction_done() * 100)
+    
+    def set_status_from_worker(self, message):
+        """Status callback for converters running on the worker thread"""
+        self.progress_updates.status(message)
+    
     def reset_processing(self):
         """Reset the processing state after queue is completed"""
+        # Apply the progress still waiting for its update first
+        self.progress_updates.flush()
         self.processing = False
         self.status_var.set("All conversions completed!")
         self.progress_var.set(100)
         messagebox.showinfo("Conversion Complete", "All files have been converted successfully.")
-        # Clear the queue list
-        self.queue_list.delete(0, tk.END)
+        # Clear the finished files from the queue list
+        self.queue_manager.remove_finished()
         self.progress_var.set(0)
     
     def on_closing(self):
         """Handle window close event properly"""
-        # Stop the worker thread
-        self.worker_running = False
-        
         # Wait for task queue to finish if processing
         if self.processing:
             response = messagebox.askquestion("Exit", 
@@ -458,5 +741,11 @@ class PDFConverterApp:
             if response == 'no':
                 return
         
+        # Stop the folder scans and the worker thread, which stops the worker processes
+        self.stop_folder_scans()
+        self.worker_running = False
+        self.task_queue.put(STOP_WORKER)
+        self.queue_journal.close()
+        
         # Destroy the window and exit
         self.root.destroy()
\ No newline at end of file
@@ -0,0 +1,370 @@
+"""
+Linearized ("fast web view") rewriting of the PDFs this program writes
+"""
+
+import os
+import re
+import zlib
+from array import array
+
+from pdf_writer import PDFPageReader, REFERENCE_PATTERN
+
+# Catalog entries a viewer needs before it can show the first page
+OPEN_DOCUMENT_KEYS = (b"/ViewerPreferences", b"/OpenAction", b"/AcroForm", b"/Threads")
+
+# Bytes kept for the linearization dictionary and the first-page trailer,
+# whose values are only known once the rest of the file has been laid out
+PARAMETERS_SIZE = 200
+FIRST_TRAILER_SIZE = 160
+
+def linearize_file(pdf_path):
+    """Rewrite a PDF in place as a linearized PDF"""
+    temp_path = pdf_path + ".linearizing"
+    try:
+        linearize_pdf(pdf_path, temp_path)
+        os.replace(temp_path, pdf_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def linearize_pdf(source_path, output_path):
+    """Write a linearized copy of a PDF written by this program (see PDFPageReader)"""
+    with PDFPageReader(source_path) as reader:
+        PDFLinearizer(reader).write(output_path)
+
+class BitWriter:
+    """Packs unsigned integers of given bit widths, most significant bit first, as hint tables need"""
+    
+    def __init__(self):
+        """Start with no data"""
+        self.data = bytearray()
+        self._value = 0
+        self._bits = 0
+    
+    def write(self, value, bits):
+        """Append value using the given number of bits"""
+        self._value = (self._value << bits) | value
+        self._bits += bits
+        while self._bits >= 8:
+            self._bits -= 8
+            self.data.append((self._value >> self._bits) & 0xFF)
+        self._value &= (1 << self._bits) - 1
+    
+    def write_all(self, values, bits):
+        """Append a row of values and pad to a byte boundary (every hint table row starts on one)"""
+        for value in values:
+            self.write(value, bits)
+        self.flush()
+    
+    def flush(self):
+        """Pad with zero bits to the next byte boundary"""
+        if self._bits:
+            self.write(0, 8 - self._bits)
+
+def bits_needed(value):
+    """Number of bits needed for values up to value"""
+    return value.bit_length()
+
+class PDFLinearizer:
+    """
+    Reorders the objects of a PDF so that a viewer can show the first page
+    as soon as the start of the file has arrived, and fetch any other page
+    with a single range request (PDF 1.7, Annex F).
+    
+    The output holds, in order: the linearization dictionary and the
+    first-page cross-reference table; the catalog; the hint stream; the first
+    page and everything it uses; every other page with the objects only it
+    uses; objects shared by several pages; the rest (page tree, document info)
+    and the main cross-reference table. Objects are renumbered so each page's
+    objects are consecutive, as the hint tables require.
+    """
+    
+    def __init__(self, reader):
+        """Plan the new object order of the PDF read by a PDFPageReader"""
+        self.reader = reader
+        # Object numbers referenced by each object, read once during planning
+        self._references = {}
+        self._plan()
+    
+    def write(self, output_path):
+        """Write the linearized PDF"""
+        with open(output_path, "wb") as f:
+            f.write(self._header)
+            f.write(self._parameters)
+            f.write(self._first_xref)
+            for source in self.open_document_objects:
+                self._copy_object(f, source)
+            f.write(self._hint_object)
+            for section in (self.first_page_objects, self.remaining_page_objects, self.shared_objects, self.other_objects):
+                for source in section:
+                    self._copy_object(f, source)
+            f.write(self._main_xref)
+    
+    def _plan(self):
+        """Sort the objects into sections, number them and lay out the file"""
+        reader = self.reader
+        pages = reader.page_objects()
+        catalog = reader.trailer_object(b"/Root")
+        info = reader.trailer_object(b"/Info")
+        self.page_count = len(pages)
+        
+        # Catalog and what the viewer needs to open the document
+        catalog_dictionary, _ = reader.read_dictionary(catalog)
+        open_keys = OPEN_DOCUMENT_KEYS
+        if re.search(rb"/PageMode\s*/UseOutlines", catalog_dictionary):
+            open_keys += (b"/Outlines",)
+        self._read_references(catalog)
+        roots = [int(match.group(1)) for key in open_keys
+                 for match in re.finditer(re.escape(key) + rb"\s+(\d+)\s+\d+\s+R", catalog_dictionary)]
+        placed = set(reader.page_tree_nodes) | set(pages) | {catalog}
+        self.open_document_objects = [catalog] + self._closure(roots, placed)
+        placed.update(self.open_document_objects)
+        
+        # Objects each page uses; anything used by more than one page is shared
+        page_objects = []
+        first_user = {}
+        shared = set()
+        for page_num, page in enumerate(pages):
+            objects = [page] + self._closure(self._read_references(page), placed)
+            page_objects.append(objects)
+            for source in objects[1:]:
+                if first_user.setdefault(source, page_num) != page_num:
+                    shared.add(source)
+        
+        self.first_page_objects = page_objects[0]
+        first_page_set = set(self.first_page_objects)
+        placed.update(self.first_page_objects)
+        
+        # Remaining pages: the page object first, then the objects only it uses
+        self.remaining_page_objects = []
+        # (first object index, object count) of each remaining page within remaining_page_objects
+        self._page_ranges = [(0, len(self.first_page_objects))]
+        self.shared_objects = []
+        for objects in page_objects[1:]:
+            start = len(self.remaining_page_objects)
+            self.remaining_page_objects.extend(source for source in objects if source not in shared or source == objects[0])
+            self._page_ranges.append((start, len(self.remaining_page_objects) - start))
+            for source in objects[1:]:
+                if source in shared and source not in first_page_set and source not in placed:
+                    self.shared_objects.append(source)
+                    placed.add(source)
+        placed.update(self.remaining_page_objects)
+        
+        # Everything else the document refers to: the page tree, outlines, document info
+        other_roots = [number for node in reader.page_tree_nodes for number in self._read_references(node)]
+        other_roots += self._read_references(catalog) + ([info] if info is not None else [])
+        self.other_objects = list(reader.page_tree_nodes) + self._closure(other_roots, placed)
+        
+        # Shared objects referenced by each page (for the hint tables)
+        self._page_shared = [[source for source in objects[1:] if source in shared] for objects in page_objects]
+        
+        self._number_objects(catalog, info)
+        self._layout()
+    
+    def _number_objects(self, catalog, info):
+        """Give the main section objects 1..m-1 and the first-page section m and up"""
+        self.numbers = {}
+        number = 1
+        for section in (self.remaining_page_objects, self.shared_objects, self.other_objects):
+            for source in section:
+                self.numbers[source] = number
+                number += 1
+        
+        self.first_section_start = number
+        self.parameters_number = number
+        number += 1
+        for section in (self.open_document_objects, self.first_page_objects):
+            for source in section:
+                self.numbers[source] = number
+                number += 1
+        self.hint_number = number
+        self.size = number + 1
+        self.catalog_number = self.numbers[catalog]
+        self.info_number = self.numbers.get(info)
+    
+    def _layout(self):
+        """Work out every object's offset, build the hint stream and the cross-reference tables"""
+        with open(self.reader.pdf_path, "rb") as f:
+            first_line = f.readline()
+        self._header = (first_line if first_line.startswith(b"%PDF-") else b"%PDF-1.4\n") + b"%\xe2\xe3\xcf\xd3\n"
+        
+        # Offsets as if there were no hint stream, which is what the hint tables hold
+        offsets = {}
+        first_xref_offset = len(self._header) + PARAMETERS_SIZE
+        first_count = self.size - self.first_section_start
+        position = first_xref_offset + len(self._xref_header(self.first_section_start, first_count)) \
+            + 20 * first_count + FIRST_TRAILER_SIZE
+        for source in self.open_document_objects:
+            offsets[source] = position
+            position += self._object_size(source)
+        hint_offset = position
+        for section in (self.first_page_objects, self.remaining_page_objects, self.shared_objects, self.other_objects):
+            for source in section:
+                offsets[source] = position
+                position += self._object_size(source)
+        
+        hint_data, shared_table_offset = self._hint_tables(offsets)
+        hint_data = zlib.compress(bytes(hint_data))
+        self._hint_object = (
+            f"{self.hint_number} 0 obj\n<< /Filter /FlateDecode /S {shared_table_offset} /Length {len(hint_data)} >>\nstream\n"
+        ).encode("ascii") + hint_data + b"\nendstream\nendobj\n"
+        hint_length = len(self._hint_object)
+        
+        # Real offsets: everything after the hint stream moves by its length
+        main_offsets = array("q", [0]) * self.first_section_start
+        first_offsets = array("q", [0]) * first_count
+        for source, offset in offsets.items():
+            if offset >= hint_offset:
+                offset += hint_length
+            number = self.numbers[source]
+            if number < self.first_section_start:
+                main_offsets[number] = offset
+            else:
+                first_offsets[number - self.first_section_start] = offset
+        first_offsets[0] = len(self._header)
+        first_offsets[-1] = hint_offset
+        
+        first_page_end = offsets[self.first_page_objects[-1]] + self._object_size(self.first_page_objects[-1]) + hint_length
+        main_xref_offset = position + hint_length
+        main_header = self._xref_header(0, self.first_section_start)
+        self._main_xref = main_header + self._xref_entries(main_offsets, free_first=True) + (
+            f"trailer\n<< /Size {self.first_section_start} >>\nstartxref\n{first_xref_offset}\n%%EOF\n"
+        ).encode("ascii")
+        file_length = main_xref_offset + len(self._main_xref)
+        
+        info = f" /Info {self.info_number} 0 R" if self.info_number else ""
+        self._first_xref = self._xref_header(self.first_section_start, first_count) + self._xref_entries(first_offsets) + self._pad(
+            f"trailer\n<< /Size {self.size} /Root {self.catalog_number} 0 R{info} /Prev {main_xref_offset}",
+            " >>\nstartxref\n0\n%%EOF\n", FIRST_TRAILER_SIZE
+        )
+        self._parameters = self._pad(
+            f"{self.parameters_number} 0 obj\n<< /Linearized 1 /L {file_length} /H [ {hint_offset} {hint_length} ] "
+            f"/O {self.numbers[self.first_page_objects[0]]} /E {first_page_end} /N {self.page_count} "
+            f"/T {main_xref_offset + len(main_header) - 1}",
+            " >>\nendobj\n", PARAMETERS_SIZE
+        )
+    
+    def _hint_tables(self, offsets):
+        """Build the page offset and shared object hint tables; returns (data, offset of the shared object table)"""
+        sizes = {}
+        def section_length(objects):
+            return sum(sizes.setdefault(source, self._object_size(source)) for source in objects)
+        
+        # Shared object identifiers: the first-page objects come first, then the shared objects section
+        shared_ids = {source: index for index, source in enumerate(self.first_page_objects + self.shared_objects)}
+        
+        page_objects = [self.first_page_objects]
+        page_objects += [self.remaining_page_objects[start:start + count] for start, count in self._page_ranges[1:]]
+        object_counts = [len(objects) for objects in page_objects]
+        page_lengths = [section_length(objects) for objects in page_objects]
+        shared_refs = [[shared_ids[source] for source in refs] for refs in self._page_shared]
+        shared_refs[0] = []
+        
+        least_objects = min(object_counts)
+        least_length = min(page_lengths)
+        object_bits = bits_needed(max(object_counts) - least_objects)
+        length_bits = bits_needed(max(page_lengths) - least_length)
+        shared_count_bits = bits_needed(max(len(refs) for refs in shared_refs))
+        shared_id_bits = bits_needed(max((max(refs) for refs in shared_refs if refs), default=0))
+        
+        # Page offset hint table (Table F.3 header, Table F.4 entries)
+        table = BitWriter()
+        for value, bits in ((least_objects, 32), (offsets[self.first_page_objects[0]], 32), (object_bits, 16),
+                            (least_length, 32), (length_bits, 16),
+                            (0, 32), (0, 16),                           # content stream offsets (not used)
+                            (least_length, 32), (length_bits, 16),      # content stream lengths: the page lengths
+                            (shared_count_bits, 16), (shared_id_bits, 16),
+                            (0, 16), (1, 16)):                          # fractional positions (not used)
+            table.write(value, bits)
+        table.write_all((count - least_objects for count in object_counts), object_bits)
+        table.write_all((length - least_length for length in page_lengths), length_bits)
+        table.write_all((len(refs) for refs in shared_refs), shared_count_bits)
+        table.write_all((shared_id for refs in shared_refs for shared_id in refs), shared_id_bits)
+        table.write_all((0 for refs in shared_refs for _ in refs), 0)
+        table.write_all((0 for _ in page_objects), 0)
+        table.write_all((length - least_length for length in page_lengths), length_bits)
+        
+        # Shared object hint table (Tables F.5 and F.6): one object per group
+        shared_table_offset = len(table.data)
+        group_lengths = [sizes.setdefault(source, self._object_size(source)) for source in shared_ids]
+        least_group = min(group_lengths)
+        group_bits = bits_needed(max(group_lengths) - least_group)
+        first_shared = self.numbers[self.shared_objects[0]] if self.shared_objects else 0
+        first_shared_offset = offsets[self.shared_objects[0]] if self.shared_objects else 0
+        for value, bits in ((first_shared, 32), (first_shared_offset, 32), (len(self.first_page_objects), 32),
+                            (len(shared_ids), 32), (0, 16), (least_group, 32), (group_bits, 16)):
+            table.write(value, bits)
+        table.write_all((length - least_group for length in group_lengths), group_bits)
+        table.write_all((0 for _ in group_lengths), 1)                 # no MD5 signatures
+        table.write_all((0 for _ in group_lengths), 0)                 # one object per group
+        return table.data, shared_table_offset
+    
+    def _copy_object(self, f, source):
+        """Write an object under its new number"""
+        dictionary, stream = self.reader.read_object(source)
+        f.write(f"{self.numbers[source]} 0 obj\n".encode("ascii"))
+        f.write(self._renumber(dictionary))
+        if stream is not None:
+            f.write(b"\nstream\n")
+            f.write(stream)
+            f.write(b"\nendstream")
+        f.write(b"\nendobj\n")
+    
+    def _object_size(self, source):
+        """Length of an object as _copy_object writes it"""
+        dictionary, stream_length = self.reader.read_dictionary(source)
+        size = len(f"{self.numbers[source]} 0 obj\n") + len(self._renumber(dictionary)) + len(b"\nendobj\n")
+        if stream_length is not None:
+            size += len(b"\nstream\n") + stream_length + len(b"\nendstream")
+        return size
+    
+    def _renumber(self, dictionary):
+        """Replace the references in a dictionary with the new object numbers"""
+        def replace(match):
+            number = self.numbers.get(int(match.group(1)))
+            return b"null" if number is None else b"%d 0 R" % number
+        return REFERENCE_PATTERN.sub(replace, dictionary)
+    
+    def _read_references(self, source):
+        """Object numbers an object refers to, read on first use"""
+        references = self._references.get(source)
+        if references is None:
+            dictionary, _ = self.reader.read_dictionary(source)
+            references = self._references[source] = [
+                number for number in map(int, (match.group(1) for match in REFERENCE_PATTERN.finditer(dictionary)))
+                if self.reader.has_object(number)
+            ]
+        return references
+    
+    def _closure(self, roots, excluded):
+        """Objects reachable from roots, depth first in the order they are referenced, skipping excluded ones"""
+        found = []
+        seen = set()
+        stack = list(reversed(roots))
+        while stack:
+            source = stack.pop()
+            if source in seen or source in excluded:
+                continue
+            seen.add(source)
+            found.append(source)
+            stack.extend(reversed(self._read_references(source)))
+        return found
+    
+    def _xref_header(self, first, count):
+        """Start of a cross-reference table with one subsection"""
+        return f"xref\n{first} {count}\n".encode("ascii")
+    
+    def _xref_entries(self, offsets, free_first=False):
+        """Cross-reference entries for consecutive objects"""
+        entries = [b"0000000000 65535 f \n"] if free_first else []
+        for offset in offsets[1:] if free_first else offsets:
+            entries.append(b"%010d 00000 n \n" % offset)
+        return b"".join(entries)
+    
+    def _pad(self, start, end, size):
+        """Join two parts of a line with spaces between them so the result is exactly size bytes"""
+        padding = size - len(start) - len(end)
+        if padding < 1:
+            raise ValueError("Linearization parameters do not fit in the space reserved for them")
+        return (start + " " * padding + end).encode("ascii")
@@ -0,0 +1,564 @@
+"""
+Streaming PDF writer for image pages
+"""
+
+import hashlib
+import itertools
+import os
+import re
+import time
+import zlib
+from array import array
+from contextlib import contextmanager
+
+# Indirect object reference ("12 0 R")
+REFERENCE_PATTERN = re.compile(rb"(\d+)\s+(\d+)\s+R\b")
+
+# Start of a stream's data, after the stream dictionary
+STREAM_PATTERN = re.compile(rb"stream\r?\n")
+
+# Start of an indirect object ("12 0 obj")
+OBJECT_HEADER_PATTERN = re.compile(rb"\s*\d+\s+\d+\s+obj\s*")
+
+# Bytes read at a time while looking for the end of an object's dictionary
+LOCATE_CHUNK_SIZE = 4096
+
+# Image XObject dictionary
+IMAGE_PATTERN = re.compile(rb"/Subtype\s*/Image\b")
+
+# Plain objects packed into each object stream
+OBJECTS_PER_STREAM = 100
+
+# Numbers the temporary files written by this process
+_TEMPORARY_IDS = itertools.count(1)
+
+def temporary_path(output_path):
+    """Path next to output_path to write it under before moving it into place, unique to this process and call"""
+    return f"{output_path}.{os.getpid()}-{next(_TEMPORARY_IDS)}.tmp"
+
+@contextmanager
+def atomic_output(output_path):
+    """
+    Yield a temporary path to write output_path under. The file is moved into
+    place when the block finishes and deleted if it fails, so readers (and other
+    writers of the same path) never see a partly written file.
+    """
+    temp_path = temporary_path(output_path)
+    try:
+        yield temp_path
+        os.replace(temp_path, output_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+class PDFImage:
+    """
+    Image data ready to be written as an image XObject
+    """
+    
+    def __init__(self, width, height, color_space, data, filter_name, smask=None, bits_per_component=8):
+        """Initialize with already encoded image data"""
+        self.width = width
+        self.height = height
+        self.color_space = color_space
+        self.data = data
+        self.filter_name = filter_name
+        self.smask = smask
+        self.bits_per_component = bits_per_component
+    
+    @classmethod
+    def from_jpeg(cls, data, width, height, mode):
+        """Wrap JPEG data so it is embedded as-is (DCTDecode)"""
+        color_space = "DeviceGray" if mode == "L" else "DeviceRGB"
+        return cls(width, height, color_space, data, "DCTDecode")
+    
+    @classmethod
+    def from_pil(cls, img):
+        """Losslessly encode a decoded PIL image (FlateDecode), keeping any alpha channel"""
+        if img.mode == "PA" or "transparency" in img.info:
+            img = img.convert("RGBA")
+        
+        smask = None
+        if img.mode in ("RGBA", "LA"):
+            alpha = img.getchannel("A")
+            smask = cls(alpha.width, alpha.height, "DeviceGray", zlib.compress(alpha.tobytes()), "FlateDecode")
+            img = img.convert(img.mode[:-1])
+        elif img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        
+        color_space = "DeviceGray" if img.mode == "L" else "DeviceRGB"
+        return cls(img.width, img.height, color_space, zlib.compress(img.tobytes()), "FlateDecode", smask)
+    
+    @classmethod
+    def from_bilevel(cls, img):
+        """Losslessly encode a black and white (mode "1") image at one bit per pixel (FlateDecode)"""
+        # PIL packs the pixels eight to a byte with 1 for white, as DeviceGray expects
+        return cls(img.width, img.height, "DeviceGray", zlib.compress(img.tobytes()), "FlateDecode",
+                   bits_per_component=1)
+
+class StreamingPDFWriter:
+    """
+    Writes a PDF one page at a time.
+    Each page's objects go to disk as soon as the page is added, so memory use
+    does not grow with the number of pages; only object offsets are kept.
+    Identical images are stored once and shared by every page that shows them.
+    With compress, content streams are Flate-compressed; with object_streams,
+    plain objects (page dictionaries, fonts) are packed into compressed object
+    streams and indexed by a cross-reference stream (PDF 1.5).
+    """
+    
+    # Object numbers reserved for the catalog and the page tree root
+    CATALOG_OBJECT = 1
+    PAGES_OBJECT = 2
+    
+    def __init__(self, output_path, page_size, compress=False, object_streams=False):
+        """Open the output file and write the header"""
+        self.output_path = output_path
+        self.page_size = page_size
+        self.compress = compress
+        self.object_streams = object_streams
+        # The file is written under a temporary name and moved to output_path by close()
+        self._temp_path = temporary_path(output_path)
+        self._file = open(self._temp_path, "wb")
+        # Byte offset of each object, indexed by object number (0 is the free entry);
+        # for an object inside an object stream, its index there
+        self._offsets = array("q", [0, 0, 0])
+        # Object stream holding each object, or 0 for objects stored directly
+        self._containers = array("q", [0, 0, 0])
+        # (object number, body) of plain objects waiting for the next object stream
+        self._pending_objects = []
+        # Content hash -> object number of each image, so repeated images are stored once
+        self._images = {}
+        self._page_objects = array("q")
+        version = b"1.5" if object_streams else b"1.4"
+        self._file.write(b"%PDF-" + version + b"\n%\xe2\xe3\xcf\xd3\n")
+    
+    @property
+    def bytes_written(self):
+        """Number of bytes written to the output file so far"""
+        return self._file.tell()
+    
+    @property
+    def page_count(self):
+        """Number of pages written so far"""
+        return len(self._page_objects)
+    
+    def add_image_page(self, image, x, y, width, height, page_size=None):
+        """Write a page showing a single image at the given position and size (in points)"""
+        page_width, page_height = page_size or self.page_size
+        
+        image_object = self._write_image(image)
+        content = f"q {width:.4f} 0 0 {height:.4f} {x:.4f} {y:.4f} cm /Im0 Do Q".encode("ascii")
+        packed = zlib.compress(content) if self.compress else content
+        if len(packed) < len(content):
+            content_object = self._write_stream({"Filter": "/FlateDecode"}, packed)
+        else:
+            # Too short to gain anything from compression
+            content_object = self._write_stream({}, content)
+        
+        page_object = self._write_object(
+            f"<< /Type /Page /Parent {self.PAGES_OBJECT} 0 R "
+            f"/MediaBox [0 0 {page_width:.4f} {page_height:.4f}] "
+            f"/Resources << /ProcSet [/PDF /ImageB /ImageC] /XObject << /Im0 {image_object} 0 R >> >> "
+            f"/Contents {content_object} 0 R >>"
+        )
+        self._page_objects.append(page_object)
+    
+    def add_pdf_pages(self, pdf_path):
+        """
+        Copy every page of another PDF written by this program (see PDFPageReader)
+        to the end of this one, without re-rendering it, and return the number of pages.
+        Objects are copied as they are read, so only object numbers are kept in memory.
+        Images already in this file (from earlier fragments) are not copied again.
+        """
+        with PDFPageReader(pdf_path) as reader:
+            page_objects = reader.page_objects()
+            
+            # Source object number -> object number in this file; the source page
+            # tree maps to this file's page tree, so copied pages get the right /Parent
+            numbers = {node: self.PAGES_OBJECT for node in reader.page_tree_nodes}
+            for page in page_objects:
+                numbers[page] = self._reserve_object()
+            
+            pending = []
+            def renumber(match):
+                source = int(match.group(1))
+                if source not in numbers:
+                    key = self._copied_image_key(reader, source)
+                    if key in self._images:
+                        numbers[source] = self._images[key]
+                    else:
+                        numbers[source] = self._reserve_object()
+                        pending.append(source)
+                        if key is not None:
+                            self._images[key] = numbers[source]
+                return b"%d 0 R" % numbers[source]
+            
+            for page in page_objects:
+                dictionary, stream = reader.read_object(page)
+                self._write_raw_object(numbers[page], REFERENCE_PATTERN.sub(renumber, dictionary), stream)
+                self._page_objects.append(numbers[page])
+                
+                # Copy what the page uses (contents, resources, fonts) right after it
+                while pending:
+                    source = pending.pop()
+                    dictionary, stream = reader.read_object(source)
+                    self._write_raw_object(numbers[source], REFERENCE_PATTERN.sub(renumber, dictionary), stream)
+        return len(page_objects)
+    
+    def close(self):
+        """Write the page tree, catalog and cross-reference table (or stream), then close the file and move it into place"""
+        # Like reportlab, a document without pages gets one blank page
+        if not self._page_objects:
+            page_width, page_height = self.page_size
+            self._page_objects.append(self._write_object(
+                f"<< /Type /Page /Parent {self.PAGES_OBJECT} 0 R "
+                f"/MediaBox [0 0 {page_width:.4f} {page_height:.4f}] /Resources << >> >>"
+            ))
+        
+        # Page tree root, written in chunks to avoid building one huge string
+        self._offsets[self.PAGES_OBJECT] = self._file.tell()
+        self._file.write(f"{self.PAGES_OBJECT} 0 obj\n<< /Type /Pages /Count {len(self._page_objects)} /Kids [".encode("ascii"))
+        for start in range(0, len(self._page_objects), 1000):
+            chunk = self._page_objects[start:start + 1000]
+            self._file.write(" ".join(f"{num} 0 R" for num in chunk).encode("ascii") + b" ")
+        self._file.write(b"] >>\nendobj\n")
+        
+        # Catalog and document information
+        self._offsets[self.CATALOG_OBJECT] = self._file.tell()
+        self._file.write(f"{self.CATALOG_OBJECT} 0 obj\n<< /Type /Catalog /Pages {self.PAGES_OBJECT} 0 R >>\nendobj\n".encode("ascii"))
+        info_object = self._write_object(
+            f"<< /Producer (Advanced PDF Converter) /CreationDate (D:{time.strftime('%Y%m%d%H%M%S')}) >>"
+        )
+        
+        if self.object_streams:
+            self._flush_object_stream()
+            self._write_xref_stream(info_object)
+            self._replace_output()
+            return
+        
+        # Cross-reference table and trailer
+        xref_offset = self._file.tell()
+        self._file.write(f"xref\n0 {len(self._offsets)}\n0000000000 65535 f \n".encode("ascii"))
+        for start in range(1, len(self._offsets), 1000):
+            chunk = self._offsets[start:start + 1000]
+            self._file.write("".join(f"{offset:010d} 00000 n \n" for offset in chunk).encode("ascii"))
+        self._file.write(
+            f"trailer\n<< /Size {len(self._offsets)} /Root {self.CATALOG_OBJECT} 0 R /Info {info_object} 0 R >>\n"
+            f"startxref\n{xref_offset}\n%%EOF\n".encode("ascii")
+        )
+        self._replace_output()
+    
+    def abort(self):
+        """Close and delete a partially written file; the file at output_path is left alone"""
+        self._file.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+    
+    def _replace_output(self):
+        """Close the finished file and move it to output_path"""
+        self._file.close()
+        os.replace(self._temp_path, self.output_path)
+    
+    def _write_image(self, image):
+        """Write an image XObject (and its soft mask), unless an identical one was written, and return its object number"""
+        digest = hashlib.sha256(f"{image.width} {image.height} {image.color_space} {image.bits_per_component} "
+                                f"{image.filter_name}".encode("ascii"))
+        digest.update(image.data)
+        smask = ""
+        if image.smask is not None:
+            smask_object = self._write_image(image.smask)
+            smask = f" /SMask {smask_object} 0 R"
+            digest.update(b"%d" % smask_object)
+        key = digest.digest()
+        if key in self._images:
+            return self._images[key]
+        
+        self._images[key] = self._write_stream(
+            {
+                "Type": "/XObject",
+                "Subtype": "/Image",
+                "Width": image.width,
+                "Height": image.height,
+                "ColorSpace": f"/{image.color_space}",
+                "BitsPerComponent": image.bits_per_component,
+                "Filter": f"/{image.filter_name}",
+            },
+            image.data,
+            smask
+        )
+        return self._images[key]
+    
+    def _write_stream(self, entries, data, extra=""):
+        """Write a stream object and return its object number"""
+        entries = dict(entries, Length=len(data))
+        dictionary = " ".join(f"/{key} {value}" for key, value in entries.items())
+        number = self._start_object()
+        self._file.write(f"<< {dictionary}{extra} >>\nstream\n".encode("ascii"))
+        self._file.write(data)
+        self._file.write(b"\nendstream\nendobj\n")
+        return number
+    
+    def _write_object(self, body):
+        """Write a non-stream object and return its object number"""
+        if self.object_streams:
+            number = self._reserve_object()
+            self._queue_object(number, body.encode("ascii"))
+            return number
+        number = self._start_object()
+        self._file.write(f"{body}\nendobj\n".encode("ascii"))
+        return number
+    
+    def _write_raw_object(self, number, dictionary, stream=None):
+        """Write an object copied from another PDF under a reserved object number"""
+        if stream is None and self.object_streams:
+            self._queue_object(number, dictionary)
+            return
+        self._start_object(number)
+        self._file.write(dictionary)
+        if stream is not None:
+            self._file.write(b"\nstream\n")
+            self._file.write(stream)
+            self._file.write(b"\nendstream")
+        self._file.write(b"\nendobj\n")
+    
+    def _queue_object(self, number, body):
+        """Add a plain object to the next object stream"""
+        self._pending_objects.append((number, body))
+        if len(self._pending_objects) >= OBJECTS_PER_STREAM:
+            self._flush_object_stream()
+    
+    def _flush_object_stream(self):
+        """Write the waiting plain objects as one compressed object stream"""
+        if not self._pending_objects:
+            return
+        index = []
+        position = 0
+        for number, body in self._pending_objects:
+            index.append(b"%d %d" % (number, position))
+            position += len(body) + 1
+        header = b" ".join(index) + b"\n"
+        data = header + b"\n".join(body for _, body in self._pending_objects) + b"\n"
+        stream_object = self._write_stream(
+            {"Type": "/ObjStm", "N": len(self._pending_objects), "First": len(header), "Filter": "/FlateDecode"},
+            zlib.compress(data)
+        )
+        for position, (number, _) in enumerate(self._pending_objects):
+            self._containers[number] = stream_object
+            self._offsets[number] = position
+        self._pending_objects = []
+    
+    def _write_xref_stream(self, info_object):
+        """Write the cross-reference stream that ends a file with object streams"""
+        xref_object = self._reserve_object()
+        xref_offset = self._file.tell()
+        self._offsets[xref_object] = xref_offset
+        
+        # Entries are (type, offset or object stream, 0 or index), big-endian, with the middle field as wide as needed
+        width = max(1, (max(xref_offset, len(self._offsets)).bit_length() + 7) // 8)
+        compressor = zlib.compressobj()
+        chunks = [compressor.compress(b"\x00" + bytes(width) + b"\xff\xff")]
+        for start in range(1, len(self._offsets), 1000):
+            rows = []
+            for number in range(start, min(start + 1000, len(self._offsets))):
+                container = self._containers[number]
+                if container:
+                    rows.append(b"\x02" + container.to_bytes(width, "big") + self._offsets[number].to_bytes(2, "big"))
+                else:
+                    rows.append(b"\x01" + self._offsets[number].to_bytes(width, "big") + b"\x00\x00")
+            chunks.append(compressor.compress(b"".join(rows)))
+        chunks.append(compressor.flush())
+        data = b"".join(chunks)
+        
+        self._file.write(
+            f"{xref_object} 0 obj\n<< /Type /XRef /Size {len(self._offsets)} /W [1 {width} 2] "
+            f"/Root {self.CATALOG_OBJECT} 0 R /Info {info_object} 0 R /Filter /FlateDecode /Length {len(data)} >>\nstream\n".encode("ascii")
+        )
+        self._file.write(data)
+        self._file.write(f"\nendstream\nendobj\nstartxref\n{xref_offset}\n%%EOF\n".encode("ascii"))
+    
+    def _copied_image_key(self, reader, number):
+        """Content hash of an image XObject in a PDF being copied, or None if the object is not an image"""
+        if not reader.has_object(number):
+            return None
+        dictionary, _ = reader.read_dictionary(number)
+        if not IMAGE_PATTERN.search(dictionary):
+            return None
+        return self._copied_object_hash(reader, number)
+    
+    def _copied_object_hash(self, reader, number):
+        """Hash of an object's dictionary and stream, with references replaced by the hashes of their targets"""
+        dictionary, stream = reader.read_object(number)
+        def replace(match):
+            target = int(match.group(1))
+            return self._copied_object_hash(reader, target).hex().encode("ascii") if reader.has_object(target) else b"null"
+        digest = hashlib.sha256(REFERENCE_PATTERN.sub(replace, dictionary))
+        if stream is not None:
+            digest.update(stream)
+        return digest.digest()
+    
+    def _reserve_object(self):
+        """Allocate an object number to be written later"""
+        self._offsets.append(0)
+        self._containers.append(0)
+        return len(self._offsets) - 1
+    
+    def _start_object(self, number=None):
+        """Allocate the next object number (or use a reserved one) and write its header"""
+        if number is None:
+            number = self._reserve_object()
+        self._offsets[number] = self._file.tell()
+        self._file.write(f"{number} 0 obj\n".encode("ascii"))
+        return number
+
+class PDFPageReader:
+    """
+    Reads the page objects of a PDF so StreamingPDFWriter can copy them.
+    Handles what this program writes (a reportlab canvas or StreamingPDFWriter):
+    a single cross-reference table, no object streams, and pages that carry their
+    own resources and media box rather than inheriting them from the page tree.
+    """
+    
+    def __init__(self, pdf_path):
+        """Open the PDF and read its cross-reference table"""
+        self.pdf_path = pdf_path
+        self._file = open(pdf_path, "rb")
+        # Byte offset of each object, by object number
+        self._offsets = {}
+        # Object numbers of the page tree's intermediate nodes (filled by page_objects)
+        self.page_tree_nodes = []
+        self._trailer = b""
+        try:
+            self._root = self._read_xref()
+        except Exception:
+            self._file.close()
+            raise
+    
+    def __enter__(self):
+        """Use the reader as a context manager"""
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Close the file when the block ends"""
+        self.close()
+    
+    def close(self):
+        """Close the file"""
+        self._file.close()
+    
+    def page_objects(self):
+        """Object numbers of the pages, in page order"""
+        catalog, _ = self.read_object(self._root)
+        pages_root = self._reference(catalog, b"/Pages")
+        
+        pages = []
+        self.page_tree_nodes = []
+        stack = [pages_root]
+        while stack:
+            number = stack.pop()
+            dictionary, _ = self.read_object(number)
+            if re.search(rb"/Type\s*/Pages\b", dictionary):
+                self.page_tree_nodes.append(number)
+                kids = re.search(rb"/Kids\s*\[(.*?)\]", dictionary, re.S)
+                refs = [int(ref[0]) for ref in REFERENCE_PATTERN.findall(kids.group(1))] if kids else []
+                stack.extend(reversed(refs))
+            else:
+                pages.append(number)
+        return pages
+    
+    def has_object(self, number):
+        """Check whether the cross-reference table lists an object"""
+        return number in self._offsets
+    
+    def trailer_object(self, key):
+        """Object number referenced by a trailer key (such as b"/Info"), or None"""
+        match = re.search(re.escape(key) + rb"\s+(\d+)\s+\d+\s+R", self._trailer)
+        return int(match.group(1)) if match else None
+    
+    def read_object(self, number):
+        """Return (dictionary bytes, stream data or None) for an object"""
+        dictionary, stream_offset, size = self._locate(number)
+        if stream_offset is None:
+            return dictionary, None
+        self._file.seek(stream_offset)
+        return dictionary, self._file.read(size)
+    
+    def read_dictionary(self, number):
+        """Return (dictionary bytes, stream length or None) for an object, without reading the stream"""
+        dictionary, _, size = self._locate(number)
+        return dictionary, size
+    
+    def _locate(self, number):
+        """Return (dictionary bytes, stream data offset, stream length), the last two None for a plain object"""
+        self._file.seek(self._offsets[number])
+        data = bytearray(self._file.read(LOCATE_CHUNK_SIZE))
+        header = OBJECT_HEADER_PATTERN.match(data)
+        if header is None:
+            raise ValueError(f"No object header for object {number} in {self.pdf_path}")
+        
+        # Only the bytes read since the last search (and a keyword's length before them) are searched again
+        search_from = header.end()
+        while True:
+            end = data.find(b"endobj", search_from)
+            stream = STREAM_PATTERN.search(data, search_from)
+            if stream and (end < 0 or stream.start() < end):
+                break
+            chunk = self._file.read(LOCATE_CHUNK_SIZE) if end < 0 else b""
+            if not chunk:
+                # Plain object
+                return bytes(data[header.end():end if end >= 0 else len(data)]).rstrip(), None, None
+            search_from = max(header.end(), len(data) - len(b"stream\r\n"))
+            data += chunk
+        
+        # The stream data itself is not read here; read_object reads it in one go
+        dictionary = bytes(data[header.end():stream.start()]).rstrip()
+        length = re.search(rb"/Length\s+(\d+)(\s+\d+\s+R)?", dictionary)
+        if length is None:
+            raise ValueError(f"Stream of object {number} has no /Length in {self.pdf_path}")
+        if length.group(2):
+            # Indirect length, stored as its own object
+            length_object, _ = self.read_object(int(length.group(1)))
+            size = int(length_object)
+        else:
+            size = int(length.group(1))
+        
+        return dictionary, self._offsets[number] + stream.end(), size
+    
+    def _read_xref(self):
+        """Read the cross-reference table and return the catalog's object number"""
+        self._file.seek(0, os.SEEK_END)
+        file_size = self._file.tell()
+        self._file.seek(max(0, file_size - 1024))
+        tail = self._file.read()
+        startxref = re.findall(rb"startxref\s+(\d+)", tail)
+        if not startxref:
+            raise ValueError(f"No cross-reference table found in {self.pdf_path}")
+        
+        self._file.seek(int(startxref[-1]))
+        lines = iter(self._file.read(file_size).split(b"\n"))
+        if next(lines).strip() != b"xref":
+            raise ValueError(f"Unsupported cross-reference format in {self.pdf_path}")
+        
+        for line in lines:
+            fields = line.split()
+            if not fields:
+                continue
+            if fields[0] == b"trailer":
+                break
+            # Subsection header: first object number and entry count
+            first, count = int(fields[0]), int(fields[1])
+            for number in range(first, first + count):
+                entry = next(lines).split()
+                if entry[2] == b"n":
+                    self._offsets[number] = int(entry[0])
+        
+        self._trailer = b"\n".join(lines)
+        return self._reference(self._trailer, b"/Root")
+    
+    def _reference(self, dictionary, key):
+        """Object number referenced by a dictionary key"""
+        match = re.search(re.escape(key) + rb"\s+(\d+)\s+\d+\s+R", dictionary)
+        if not match:
+            raise ValueError(f"{key.decode()} not found in {self.pdf_path}")
+        return int(match.group(1))
@@ -0,0 +1,65 @@
+"""
+Coalesced, rate-limited progress updates from the worker thread to the UI
+"""
+
+import threading
+import time
+
+class ProgressAggregator:
+    """
+    Collects progress reported by the worker thread (finished tasks and the
+    latest status message) and applies it on the Tk thread in one go, at most
+    max_updates_per_second times a second.
+    Only one flush is scheduled with the event loop at a time, so the UI does
+    the same amount of work per second however fast files finish.
+    
+    apply(finished, outputs, status) runs on the Tk thread with finished as
+    {state: [task IDs]}, outputs as {task ID: output path} and status as
+    (message, with_throughput) or None.
+    """
+    
+    def __init__(self, root, apply, max_updates_per_second=10):
+        """Initialize for the Tk root and the function that applies the updates"""
+        self.root = root
+        self.apply = apply
+        self.interval = 1 / max_updates_per_second
+        self._lock = threading.Lock()
+        self._finished = {}
+        self._outputs = {}
+        self._status = None
+        self._scheduled = False
+        self._last_flush = 0
+    
+    def finished(self, task_ids, state, output_path=None):
+        """Report tasks handed back as done, skipped or failed, and the file they went to (any thread)"""
+        if not task_ids:
+            return
+        with self._lock:
+            self._finished.setdefault(state, []).extend(task_ids)
+            if output_path:
+                self._outputs.update(dict.fromkeys(task_ids, output_path))
+            self._schedule()
+    
+    def status(self, message, with_throughput=False):
+        """Report a status message; only the latest one before a flush is shown (any thread)"""
+        with self._lock:
+            self._status = (message, with_throughput)
+            self._schedule()
+    
+    def flush(self):
+        """Apply everything reported since the last flush (Tk thread)"""
+        with self._lock:
+            finished, outputs, status = self._finished, self._outputs, self._status
+            self._finished, self._outputs, self._status = {}, {}, None
+            self._scheduled = False
+            self._last_flush = time.monotonic()
+        if finished or status is not None:
+            self.apply(finished, outputs, status)
+    
+    def _schedule(self):
+        """Schedule a flush unless one is pending, no sooner than the interval after the last one (lock held)"""
+        if self._scheduled:
+            return
+        self._scheduled = True
+        delay = self._last_flush + self.interval - time.monotonic()
+        self.root.after(max(0, int(delay * 1000)), self.flush)
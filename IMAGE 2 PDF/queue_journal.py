@@ -0,0 +1,127 @@
+"""
+Append-only journal of the conversion queue, used to resume unfinished work after a crash
+"""
+
+import json
+import os
+
+# Name of the journal file kept in the user's home directory
+JOURNAL_NAME = ".pdf_converter_queue.jsonl"
+
+def default_journal_path():
+    """Path of the journal in the user's home directory"""
+    return os.path.join(os.path.expanduser("~"), JOURNAL_NAME)
+
+class QueueJournal:
+    """
+    Records the queue as JSON lines: files added (with their task IDs), removed
+    and moved, the output directory of each batch, and tasks finished as
+    done, skipped or failed (with their output paths).
+    Each call appends all its lines with one write, so the queue manager batches
+    writes simply by handing over whole chunks of files and whole progress
+    updates. A line cut short by a crash is ignored when the journal is read.
+    Replaying the journal gives the files that were queued or being converted
+    but never finished.
+    """
+    
+    def __init__(self, path=None):
+        """Initialize for a journal file; nothing is written until start()"""
+        self.path = path or default_journal_path()
+        # Output directory of the last batch, kept when the journal is compacted
+        self.output_dir = None
+        self._fd = None
+    
+    def load(self):
+        """Return the unfinished files as a list of (path, file type) in queue order, and the last output directory"""
+        order = []
+        # task ID -> position in order, so replaying a swap is two lookups
+        positions = {}
+        files = {}
+        output_dir = None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError:
+            return [], None
+        
+        for line in lines:
+            try:
+                record = json.loads(line)
+                op = record["op"]
+                if op == "add":
+                    for task_id, path, file_type in record["files"]:
+                        files[task_id] = (path, file_type)
+                        positions[task_id] = len(order)
+                        order.append(task_id)
+                elif op in ("remove", "finish"):
+                    for task_id in record["ids"]:
+                        files.pop(task_id, None)
+                elif op == "swap":
+                    task_id, other_id = record["ids"]
+                    first, second = positions[task_id], positions[other_id]
+                    order[first], order[second] = other_id, task_id
+                    positions[task_id], positions[other_id] = second, first
+                elif op == "batch":
+                    output_dir = record["output_dir"]
+            except (ValueError, KeyError, TypeError):
+                # Torn or foreign line
+                continue
+        return [files[task_id] for task_id in order if task_id in files], output_dir
+    
+    def start(self, output_dir=None):
+        """Start a new journal, dropping what the old one recorded"""
+        self.output_dir = output_dir
+        self.compact([])
+    
+    def compact(self, queued):
+        """Replace the journal with the queued files only, given as (task ID, path, file type) (atomically, via a temporary file)"""
+        self.close()
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            if self.output_dir:
+                f.write(self._line({"op": "batch", "output_dir": self.output_dir}))
+            queued = [list(item) for item in queued]
+            if queued:
+                f.write(self._line({"op": "add", "files": queued}))
+        os.replace(temp_path, self.path)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+    
+    def added(self, files):
+        """Record files added to the queue, given as (task ID, path, file type)"""
+        if files:
+            self._append({"op": "add", "files": [list(item) for item in files]})
+    
+    def removed(self, task_ids):
+        """Record files removed from the queue"""
+        self._append({"op": "remove", "ids": list(task_ids)})
+    
+    def swapped(self, task_id, other_id):
+        """Record two queued files exchanging places"""
+        self._append({"op": "swap", "ids": [task_id, other_id]})
+    
+    def batch_started(self, output_dir):
+        """Record the output directory of a batch"""
+        self.output_dir = output_dir
+        self._append({"op": "batch", "output_dir": output_dir})
+    
+    def finished(self, task_ids, state, outputs=None):
+        """Record tasks finished as done, skipped or failed, with their output paths from outputs (task ID -> path)"""
+        record = {"op": "finish", "state": state, "ids": list(task_ids)}
+        if outputs:
+            record["outputs"] = [[task_id, outputs[task_id]] for task_id in task_ids if task_id in outputs]
+        self._append(record)
+    
+    def close(self):
+        """Close the journal file"""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+    
+    def _append(self, record):
+        """Append one record with a single write"""
+        if self._fd is not None:
+            os.write(self._fd, self._line(record).encode("utf-8"))
+    
+    def _line(self, record):
+        """A record as a JSON line"""
+        return json.dumps(record, separators=(",", ":")) + "\n"
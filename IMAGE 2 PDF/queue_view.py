@@ -0,0 +1,153 @@
+"""
+Virtualized list view for the conversion queue
+"""
+
+import tkinter as tk
+from tkinter import ttk
+from tkinter import font as tkfont
+
+class VirtualQueueView:
+    """
+    Shows a window of a long list of rows in a Listbox.
+    The Listbox only ever holds the rows that fit on screen; the scrollbar,
+    mouse wheel and arrow keys move the window over the rows of the source.
+    Changes to the rows only schedule a redraw, so any number of adds,
+    removals and completions between two idle moments of the event loop
+    cost one redraw of the visible rows.
+    
+    The source needs row_count() and row_label(row) -> (text, colour or None).
+    """
+    
+    def __init__(self, parent, source, height=10):
+        """Create the Listbox and its scrollbar in parent"""
+        self.source = source
+        # First row shown, and the selected row (rows of the source, not of the Listbox)
+        self.top = 0
+        self.selected = None
+        self._visible_rows = height
+        self._redraw_pending = False
+        
+        self.scrollbar = ttk.Scrollbar(parent, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        self.listbox = tk.Listbox(parent, height=height, selectmode=tk.SINGLE, exportselection=False)
+        self.listbox.pack(fill=tk.BOTH, expand=True)
+        
+        self.listbox.bind('<<ListboxSelect>>', self._on_select)
+        self.listbox.bind('<Configure>', self._on_resize)
+        self.listbox.bind('<MouseWheel>', self._on_wheel)
+        self.listbox.bind('<Button-4>', self._on_wheel)
+        self.listbox.bind('<Button-5>', self._on_wheel)
+        self.listbox.bind('<Up>', lambda event: self._step(-1))
+        self.listbox.bind('<Down>', lambda event: self._step(1))
+    
+    def bind(self, sequence, callback):
+        """Bind an event on the Listbox"""
+        self.listbox.bind(sequence, callback, add="+")
+    
+    def refresh(self):
+        """Redraw the visible rows once the event loop is idle"""
+        if not self._redraw_pending:
+            self._redraw_pending = True
+            self.listbox.after_idle(self._redraw)
+    
+    def row_changed(self, row):
+        """Redraw if a changed row is on screen"""
+        if self.top <= row < self.top + self._visible_rows:
+            self.refresh()
+    
+    def rows_removed(self, row, count=1):
+        """Keep the selection on the same row after count rows from row on were removed"""
+        if self.selected is not None:
+            if self.selected >= row + count:
+                self.selected -= count
+            elif self.selected >= row:
+                self.selected = None
+        if row < self.top:
+            self.top = max(row, self.top - count)
+        self.refresh()
+    
+    def reset(self):
+        """Scroll back to the top and drop the selection, after the rows were cleared"""
+        self.top = 0
+        self.selected = None
+        self.refresh()
+    
+    def selected_row(self):
+        """Row of the source that is selected, or None"""
+        return self.selected
+    
+    def select(self, row):
+        """Select a row and scroll it into view"""
+        self.selected = row
+        if row < self.top:
+            self.top = row
+        elif row >= self.top + self._visible_rows:
+            self.top = row - self._visible_rows + 1
+        self.refresh()
+    
+    def scroll(self, rows):
+        """Move the window by a number of rows"""
+        self.top += rows
+        self.refresh()
+    
+    def yview(self, *args):
+        """Scrollbar command: 'moveto fraction' or 'scroll n units|pages'"""
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * self.source.row_count())
+        elif args[0] == "scroll":
+            step = self._visible_rows if args[2] == "pages" else 1
+            self.top += int(args[1]) * step
+        self.refresh()
+    
+    def _redraw(self):
+        """Put the rows in the window into the Listbox and update the scrollbar"""
+        self._redraw_pending = False
+        total = self.source.row_count()
+        self.top = max(0, min(self.top, total - self._visible_rows))
+        end = min(total, self.top + self._visible_rows)
+        
+        labels = [self.source.row_label(row) for row in range(self.top, end)]
+        self.listbox.delete(0, tk.END)
+        if labels:
+            self.listbox.insert(tk.END, *[text for text, _ in labels])
+        for index, (_, colour) in enumerate(labels):
+            if colour:
+                self.listbox.itemconfig(index, foreground=colour)
+        
+        if self.selected is not None and self.selected >= total:
+            self.selected = None
+        if self.selected is not None and self.top <= self.selected < end:
+            self.listbox.selection_set(self.selected - self.top)
+        
+        if total:
+            self.scrollbar.set(self.top / total, end / total)
+        else:
+            self.scrollbar.set(0, 1)
+    
+    def _on_select(self, event):
+        """Remember the clicked row as a row of the source"""
+        selection = self.listbox.curselection()
+        if selection:
+            self.selected = self.top + selection[0]
+    
+    def _on_resize(self, event):
+        """Show as many rows as fit in the new height"""
+        line_height = tkfont.Font(font=self.listbox.cget("font")).metrics("linespace") + 1
+        visible_rows = max(1, event.height // line_height)
+        if visible_rows != self._visible_rows:
+            self._visible_rows = visible_rows
+            self.refresh()
+    
+    def _on_wheel(self, event):
+        """Scroll three rows per wheel notch (MouseWheel on Windows and macOS, buttons 4 and 5 on X11)"""
+        self.scroll(-3 if event.num == 4 or event.delta > 0 else 3)
+        return "break"
+    
+    def _step(self, rows):
+        """Move the selection up or down with the arrow keys"""
+        total = self.source.row_count()
+        if total:
+            current = self.selected if self.selected is not None else self.top - rows
+            self.select(max(0, min(total - 1, current + rows)))
+        return "break"
@@ -0,0 +1,158 @@
+"""
+Line and page breaking for text drawn with the PDF fonts
+"""
+
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+# Layout of text pages, in points
+LINE_HEIGHT = 14
+MARGIN = 50
+
+class TextLayout:
+    """
+    Breaks paragraphs into lines that fit a given width.
+    Each word is measured once per font and cached in font units
+    (thousandths of the font size), so a line's width is a running sum
+    instead of a new measurement of the whole line for every word.
+    Line breaks are identical to measuring each candidate line with stringWidth.
+    """
+    
+    def __init__(self, max_cached_words=200000):
+        """Initialize with an empty width cache per font"""
+        self.max_cached_words = max_cached_words
+        # font name -> {word: width in font units}
+        self._widths = {}
+    
+    def wrap(self, text, font_name, font_size, max_width):
+        """
+        Split text into lines narrower than max_width (in points).
+        A word that is wider than max_width on its own gets a line to itself.
+        """
+        widths = self._font_widths(font_name)
+        space = self._units(widths, " ", font_name)
+        
+        lines = []
+        current_words = []
+        current_units = 0
+        for word in text.split():
+            units = self._units(widths, word, font_name)
+            test_units = current_units + space + units if current_words else units
+            # Scaled to points in the same order as stringWidth, so results match to the last bit
+            if test_units * 0.001 * font_size < max_width:
+                current_words.append(word)
+                current_units = test_units
+            else:
+                lines.append(" ".join(current_words))
+                current_words = [word]
+                current_units = units
+        
+        if current_words:
+            lines.append(" ".join(current_words))
+        return lines
+    
+    def _font_widths(self, font_name):
+        """Return the width cache for a font, starting over if it grew too large"""
+        widths = self._widths.get(font_name)
+        if widths is None or len(widths) > self.max_cached_words:
+            widths = self._widths[font_name] = {}
+        return widths
+    
+    def _units(self, widths, word, font_name):
+        """Width of a word in font units, measured on first use"""
+        units = widths.get(word)
+        if units is None:
+            # Glyph widths of the standard fonts are whole font units; rounding
+            # drops the float noise of scaling to size 1000 and back
+            units = widths[word] = round(stringWidth(word, font_name, 1000), 6)
+        return units
+
+class Paginator:
+    """
+    Places headings and wrapped paragraphs on pages from top to bottom.
+    Finished pages are collected as lists of drawing operations:
+    ("heading", y, text), ("text", y, lines, continued), ("title", y, text, font name, size)
+    and ("image", y, key, x, width, height), where continued marks the rest of a paragraph
+    carried over from the previous page and key identifies the image to draw.
+    Page breaks only depend on the blocks, so pages can be drawn anywhere,
+    in any process, and come out the same.
+    """
+    
+    def __init__(self, page_size):
+        """Initialize with an empty first page"""
+        self.page_width, self.page_height = page_size
+        self.y = self.page_height - MARGIN
+        self.operations = []
+        # Finished pages not taken yet
+        self.pages = []
+    
+    def add_heading(self, text):
+        """Place a heading line"""
+        self._make_room()
+        self.operations.append(("heading", self.y, text))
+        self.y -= LINE_HEIGHT * 2
+        # Add some space between paragraphs
+        self.y -= LINE_HEIGHT
+    
+    def add_paragraph(self, lines):
+        """Place the lines of a wrapped paragraph, continuing on new pages as needed"""
+        self._make_room()
+        start = self.y
+        segment = []
+        continued = False
+        for line in lines[:-1]:
+            segment.append(line)
+            self.y -= LINE_HEIGHT
+            
+            # Check if we need a new page
+            if self.y < MARGIN + LINE_HEIGHT:
+                self.operations.append(("text", start, segment, continued))
+                self.new_page()
+                start = self.y
+                segment = []
+                continued = True
+        
+        # Add the last line
+        segment.append(lines[-1])
+        self.y -= LINE_HEIGHT
+        self.operations.append(("text", start, segment, continued))
+        
+        # Add some space between paragraphs
+        self.y -= LINE_HEIGHT
+    
+    def add_image(self, key, width, height):
+        """Place an image centered in the column, on a new page if it does not fit on this one"""
+        self._make_room()
+        if self.y - height < MARGIN and self.operations:
+            self.new_page()
+        self.y -= height
+        self.operations.append(("image", self.y, key, (self.page_width - width) / 2, width, height))
+        # Add some space after the image
+        self.y -= LINE_HEIGHT
+    
+    def add_title(self, y_offset, text, font_name, font_size):
+        """Place a line of a title page, y_offset points below the top of the page"""
+        self.operations.append(("title", self.page_height - y_offset, text, font_name, font_size))
+    
+    def new_page(self):
+        """Finish the current page, even if it is empty"""
+        self.pages.append(self.operations)
+        self.operations = []
+        self.y = self.page_height - MARGIN
+    
+    def finish(self):
+        """Finish the last page, unless nothing was placed on it"""
+        if self.operations:
+            self.new_page()
+    
+    def take_pages(self, count=None):
+        """Remove and return the finished pages (at most count of them)"""
+        if count is None:
+            count = len(self.pages)
+        pages = self.pages[:count]
+        del self.pages[:count]
+        return pages
+    
+    def _make_room(self):
+        """Start a new page if the current one has no room for another line"""
+        if self.y < MARGIN + LINE_HEIGHT:
+            self.new_page()